@@ -4,6 +4,8 @@
 -- 2. Use the newly created database
 Create Database If Not Exists QuizSystem;
 USE QuizSystem;
+-- Indexes and the remaining tables come from the migrations: run
+-- "python migrate.py" in backend/ after this script.
 -- 3. Create the Strong Entities
 -- Subject/Course (Strong Entity)
 -- Stores the 5 subjects: English, Maths, Chemistry, Physics, Biology
@@ -15,8 +17,8 @@ CREATE TABLE Subject (
 CREATE TABLE Student (
     StudentID INT PRIMARY KEY,
     SName VARCHAR(100) NOT NULL,
-    -- Store a placeholder password. In a real app, use a strong hash.
-    SPassword VARCHAR(50) NOT NULL
+    -- scrypt hash (backend/passwords.py); plaintext values are rehashed on login
+    SPassword VARCHAR(255) NOT NULL
 );
 -- Instructor (Strong Entity - Who manages the quiz)
 CREATE TABLE Instructor (
@@ -24,14 +26,14 @@ CREATE TABLE Instructor (
     IName VARCHAR(100) NOT NULL,
     -- Instructor is associated with one course
     SubjectID INT,
-    IPassword VARCHAR(50) NOT NULL,
+    IPassword VARCHAR(255) NOT NULL,
     FOREIGN KEY (SubjectID) REFERENCES Subject(SubjectID)
 );
 -- Admin (New - For admin management)
 CREATE TABLE Admin (
     AdminID INT PRIMARY KEY AUTO_INCREMENT,
     AName VARCHAR(100) NOT NULL,
-    APassword VARCHAR(50) NOT NULL
+    APassword VARCHAR(255) NOT NULL
 );
 -- Question (Strong Entity - The quiz content)
 -- Contains the question text, options, and correct answer
@@ -71,6 +73,49 @@ CREATE TABLE QuestionAttempt (
     FOREIGN KEY (AttemptID) REFERENCES QuizAttempt(AttemptID) ON DELETE CASCADE,
     FOREIGN KEY (QuestionID) REFERENCES Question(QuestionID)
 );
+-- StudentSubjectSummary (Derived - One row per Student and Subject)
+-- Running totals of QuizAttempt, updated by every quiz submission.
+-- Can be recomputed from QuizAttempt with: python summaries.py rebuild
+CREATE TABLE StudentSubjectSummary (
+    StudentID INT NOT NULL,
+    SubjectID INT NOT NULL,
+    Attempts INT NOT NULL DEFAULT 0,
+    BestScore INT NOT NULL DEFAULT 0,
+    ScoreSum INT NOT NULL DEFAULT 0,
+    LastAttempt DATETIME NULL,
+    PRIMARY KEY (StudentID, SubjectID),
+    INDEX (SubjectID, BestScore),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE,
+    FOREIGN KEY (SubjectID) REFERENCES Subject(SubjectID)
+);
+-- QuizAttemptArchive (Attempts moved out of QuizAttempt by backend/archive.py)
+-- One row per attempt; Answers packs its QuestionAttempt rows, 5 bytes each.
+CREATE TABLE QuizAttemptArchive (
+    AttemptID INT PRIMARY KEY,
+    StudentID INT NOT NULL,
+    SubjectID INT NOT NULL,
+    AttemptTimestamp DATETIME NULL,
+    Score INT NOT NULL,
+    Answers BLOB NOT NULL,
+    INDEX idx_archive_student_time (StudentID, AttemptTimestamp, SubjectID, Score),
+    INDEX idx_archive_subject_student (SubjectID, StudentID, Score),
+    INDEX idx_archive_subject_attempt (SubjectID, AttemptID, Score),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE,
+    FOREIGN KEY (SubjectID) REFERENCES Subject(SubjectID)
+);
+-- ArchivedSeenQuestion (Questions each student was given in archived attempts)
+CREATE TABLE ArchivedSeenQuestion (
+    StudentID INT NOT NULL,
+    QuestionID INT NOT NULL,
+    PRIMARY KEY (StudentID, QuestionID),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE
+);
+-- CacheVersion (Cache invalidation across API workers, see backend/cache_bus.py)
+CREATE TABLE CacheVersion (
+    CacheKey VARCHAR(64) PRIMARY KEY,
+    Version BIGINT NOT NULL,
+    UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)
+);
 -- 6. Insert Initial Data
 -- Subjects (5 Courses)
 INSERT INTO Subject (SubjectName) VALUES
@@ -80,6 +125,7 @@ INSERT INTO Subject (SubjectName) VALUES
 ('Physics'),
 ('Biology');
 -- Default User Credentials: Student@123 / Admin@123
+-- Seeded in plaintext; each is replaced by its hash at the first login
 -- Instructors (Dummy Data)
 -- Admin@123 for all instructors
 INSERT INTO Instructor (IName, SubjectID, IPassword) VALUES
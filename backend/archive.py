@@ -0,0 +1,321 @@
+"""Archival of old quiz attempts.
+
+QuizAttempt and QuestionAttempt grow with every quiz ever taken. Attempts
+older than ARCHIVE_AFTER_DAYS are moved to QuizAttemptArchive (migration
+0009): one row per attempt, with its answers packed into a small binary
+blob by pack_answers(). The results history, grade lists, student lists,
+export, leaderboards and the summary rebuild read both tables, so an
+archived attempt looks the same as a live one. The questions a student
+was given are also recorded in ArchivedSeenQuestion, so quiz generation
+still avoids them. Item analysis only uses live attempts.
+
+Attempts are moved oldest AttemptID first, ARCHIVE_BATCH_SIZE per
+transaction, and a run stops at the first attempt that is too young. So
+every archived AttemptID is lower than every live one. The newest attempt
+is never moved, which keeps the AUTO_INCREMENT counter of QuizAttempt
+above the archived IDs on servers that recompute it at restart. Run it
+from cron:
+
+    python archive.py run                      # older than ARCHIVE_AFTER_DAYS
+    python archive.py run --before 2025-09-01
+    python archive.py status
+
+QuizAttempt can also be partitioned by month on AttemptTimestamp:
+
+    python archive.py partition
+
+MySQL does not allow foreign keys on partitioned tables, so this drops the
+keys from QuizAttempt to Student and Subject and from QuestionAttempt to
+QuizAttempt; deleting a student then removes their attempts explicitly
+(admin.delete_student). Once partitioned, every run adds partitions for
+the next ARCHIVE_PARTITIONS_AHEAD months and drops the monthly partitions
+it has emptied, which returns their space at once instead of leaving it
+free inside the table.
+"""
+import argparse
+import os
+import struct
+import sys
+from datetime import date, datetime, timedelta
+
+from database import get_db_connection
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+ARCHIVE_PARTITIONS_AHEAD = int(os.getenv('ARCHIVE_PARTITIONS_AHEAD', 3))
+
+# Oldest first: reading them in this order keeps rows in AttemptID order
+ATTEMPT_TABLES = ("QuizAttemptArchive", "QuizAttempt")
+
+OPTIONS = ('A', 'B', 'C', 'D')
+# QuestionID, then 0 for a skipped question or 1-4 for A-D
+_ANSWER = struct.Struct('<IB')
+
+# Only one archiver at a time; a second run exits instead of waiting
+LOCK_NAME = 'quizsystem_archive'
+
+BATCH_QUERY = """
+    SELECT AttemptID, StudentID, SubjectID, AttemptTimestamp, Score
+    FROM QuizAttempt
+    WHERE AttemptID < %s
+    ORDER BY AttemptID LIMIT %s
+    FOR UPDATE
+"""
+ANSWERS_QUERY = """
+    SELECT AttemptID, QuestionID, StudentAnswer
+    FROM QuestionAttempt WHERE AttemptID BETWEEN %s AND %s
+"""
+INSERT_SEEN_SQL = "INSERT IGNORE INTO ArchivedSeenQuestion (StudentID, QuestionID) VALUES (%s, %s)"
+INSERT_ARCHIVE_SQL = """
+    INSERT INTO QuizAttemptArchive (AttemptID, StudentID, SubjectID, AttemptTimestamp, Score, Answers)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+PARTITIONS_QUERY = """
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'QuizAttempt' AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+"""
+FOREIGN_KEYS_QUERY = """
+    SELECT TABLE_NAME, CONSTRAINT_NAME
+    FROM information_schema.REFERENTIAL_CONSTRAINTS
+    WHERE CONSTRAINT_SCHEMA = DATABASE()
+      AND (TABLE_NAME = 'QuizAttempt' OR REFERENCED_TABLE_NAME = 'QuizAttempt')
+"""
+FUTURE_PARTITION = 'pmax'
+
+
+def pack_answers(answers):
+    """[(QuestionID, 'A'-'D' or None), ...] -> bytes, 5 per answer."""
+    return b''.join(_ANSWER.pack(question_id, OPTIONS.index(answer) + 1 if answer in OPTIONS else 0)
+                    for question_id, answer in sorted(answers, key=lambda item: item[0]))
+
+
+def unpack_answers(data):
+    return [(question_id, OPTIONS[code - 1] if code else None) for question_id, code in _ANSWER.iter_unpack(data)]
+
+
+def archive_batch(conn, cutoff, newest, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to batch_size attempts older than cutoff; returns how many were moved."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(BATCH_QUERY, (newest, batch_size))
+        attempts = []
+        for row in cursor.fetchall():
+            if row[3] is None or row[3] >= cutoff:
+                break
+            attempts.append(row)
+        if not attempts:
+            conn.rollback()
+            return 0
+        # The batch is a prefix of the table in AttemptID order, locked by
+        # the FOR UPDATE above, so an ID range selects exactly its rows
+        first, last = attempts[0][0], attempts[-1][0]
+        cursor.execute(ANSWERS_QUERY, (first, last))
+        answers = {}
+        for attempt_id, question_id, answer in cursor.fetchall():
+            answers.setdefault(attempt_id, []).append((question_id, answer))
+        cursor.executemany(INSERT_ARCHIVE_SQL,
+                           [row + (pack_answers(answers.get(row[0], ())),) for row in attempts])
+        seen = {(row[1], question_id) for row in attempts for question_id, _ in answers.get(row[0], ())}
+        if seen:
+            cursor.executemany(INSERT_SEEN_SQL, sorted(seen))
+        cursor.execute("DELETE FROM QuestionAttempt WHERE AttemptID BETWEEN %s AND %s", (first, last))
+        cursor.execute("DELETE FROM QuizAttempt WHERE AttemptID BETWEEN %s AND %s", (first, last))
+        conn.commit()
+        return len(attempts)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def archive_attempts(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE, log=print):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(AttemptID) FROM QuizAttempt")
+        newest = cursor.fetchone()[0]
+        conn.rollback()
+    finally:
+        cursor.close()
+    if newest is None:
+        return 0
+    moved = 0
+    while True:
+        count = archive_batch(conn, cutoff, newest, batch_size)
+        moved += count
+        if count:
+            log(f"Archived {moved} attempts")
+        if count < batch_size:
+            return moved
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition(month):
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_next_month(month):%Y-%m-%d}')"
+
+
+def _upper_bound(description):
+    """PARTITION_DESCRIPTION of a RANGE COLUMNS partition -> date, None for MAXVALUE."""
+    if description == 'MAXVALUE':
+        return None
+    return datetime.strptime(description.strip("'")[:10], '%Y-%m-%d').date()
+
+
+def partitions(cursor):
+    cursor.execute(PARTITIONS_QUERY)
+    return [(name, _upper_bound(description), rows) for name, description, rows in cursor.fetchall()]
+
+
+def partition_table(conn, ahead=ARCHIVE_PARTITIONS_AHEAD, log=print):
+    """Partition QuizAttempt by month, from its oldest attempt to `ahead` months from now."""
+    cursor = conn.cursor()
+    try:
+        if partitions(cursor):
+            log("QuizAttempt is already partitioned")
+            return False
+        cursor.execute("SELECT MIN(AttemptTimestamp) FROM QuizAttempt")
+        oldest = cursor.fetchone()[0]
+        month = _month_start(oldest.date() if oldest else date.today())
+        last = _month_start(date.today())
+        for _ in range(ahead):
+            last = _next_month(last)
+        definitions = []
+        while month <= last:
+            definitions.append(_partition(month))
+            month = _next_month(month)
+        definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+        cursor.execute(FOREIGN_KEYS_QUERY)
+        for table, constraint in cursor.fetchall():
+            log(f"Dropping foreign key {table}.{constraint}")
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+        # Every unique key of a partitioned table has to include the partitioning column
+        log("Adding AttemptTimestamp to the primary key")
+        cursor.execute("""
+            ALTER TABLE QuizAttempt
+                MODIFY AttemptTimestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY, ADD PRIMARY KEY (AttemptID, AttemptTimestamp)
+        """)
+        log(f"Creating {len(definitions)} partitions")
+        cursor.execute("ALTER TABLE QuizAttempt PARTITION BY RANGE COLUMNS (AttemptTimestamp) ("
+                       + ", ".join(definitions) + ")")
+        return True
+    finally:
+        cursor.close()
+
+
+def maintain_partitions(conn, cutoff, ahead=ARCHIVE_PARTITIONS_AHEAD, log=print):
+    """Add the coming months' partitions and drop the ones archival has emptied."""
+    cursor = conn.cursor()
+    try:
+        existing = partitions(cursor)
+        if not existing or existing[-1][0] != FUTURE_PARTITION:
+            return
+        bounded = [(name, upper) for name, upper, _ in existing if upper is not None]
+        month = bounded[-1][1] if bounded else _month_start(date.today())
+        last = _month_start(date.today())
+        for _ in range(ahead):
+            last = _next_month(last)
+        definitions = []
+        while month <= last:
+            definitions.append(_partition(month))
+            month = _next_month(month)
+        if definitions:
+            log(f"Adding {len(definitions)} partitions")
+            cursor.execute(f"ALTER TABLE QuizAttempt REORGANIZE PARTITION {FUTURE_PARTITION} INTO ("
+                           + ", ".join(definitions)
+                           + f", PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))")
+
+        for name, upper in bounded:
+            if upper > cutoff.date():
+                break
+            cursor.execute(f"SELECT 1 FROM QuizAttempt PARTITION ({name}) LIMIT 1")
+            if cursor.fetchone():
+                break  # Held back by the newest attempt, or by an archival error
+            log(f"Dropping empty partition {name}")
+            cursor.execute(f"ALTER TABLE QuizAttempt DROP PARTITION {name}")
+    finally:
+        cursor.close()
+
+
+def run(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE, log=print):
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("Another archive run is in progress")
+    try:
+        moved = archive_attempts(conn, cutoff, batch_size, log)
+        maintain_partitions(conn, cutoff, log=log)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchone()
+        cursor.close()
+    return moved
+
+
+def status(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*), MIN(AttemptTimestamp) FROM QuizAttempt")
+        live, oldest_live = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*), MIN(AttemptTimestamp), MAX(AttemptTimestamp) FROM QuizAttemptArchive")
+        archived, oldest_archived, newest_archived = cursor.fetchone()
+        months = partitions(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return {
+        "live": live,
+        "oldest_live": oldest_live,
+        "archived": archived,
+        "archived_from": oldest_archived,
+        "archived_to": newest_archived,
+        "partitions": months,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Archive old quiz attempts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="move old attempts to QuizAttemptArchive")
+    run_parser.add_argument("--before", type=datetime.fromisoformat,
+                            help=f"cutoff date (default: {ARCHIVE_AFTER_DAYS} days ago)")
+    run_parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    commands.add_parser("partition", help="partition QuizAttempt by month (drops its foreign keys)")
+    commands.add_parser("status", help="count live and archived attempts")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    if not conn:
+        return 1
+    try:
+        if args.command == "run":
+            cutoff = args.before or datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+            print(f"Archiving attempts before {cutoff:%Y-%m-%d %H:%M:%S}")
+            print(f"Moved {run(conn, cutoff, args.batch_size)} attempts")
+        elif args.command == "partition":
+            partition_table(conn)
+        else:
+            info = status(conn)
+            print(f"live      {info['live']:>10} attempts, oldest {info['oldest_live'] or '-'}")
+            print(f"archived  {info['archived']:>10} attempts, "
+                  f"{info['archived_from'] or '-'} to {info['archived_to'] or '-'}")
+            for name, upper, rows in info['partitions']:
+                print(f"partition {name:<10} below {upper or 'MAXVALUE'}, ~{rows} rows")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
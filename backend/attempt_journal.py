@@ -0,0 +1,404 @@
+"""Write-behind persistence for quiz attempts.
+
+With ATTEMPT_WRITE_MODE=write_behind, submit_quiz grades the quiz, appends
+the attempt to a local journal file (fsynced) and returns immediately. A
+background thread drains the journal into MySQL in large batched
+transactions. With the default ATTEMPT_WRITE_MODE=sync, attempts are
+written inside the request as before.
+
+Each worker process writes its own journal file in ATTEMPT_JOURNAL_DIR,
+attempts-<host>-<node>-<slot>.jsonl: the host name, a random id created
+once and kept in the directory's node-id file, and the lowest slot that
+no running worker holds. The file name is also the worker's checkpoint
+key, so it stays the same across restarts and differs between hosts even
+when every container runs the app as PID 1. Entries carry an increasing
+sequence number and every flush stores the last flushed sequence in
+AttemptJournalCheckpoint in the same transaction as the attempts. A
+restarted worker takes over its slot's file and flushes what is left in
+it; journals of slots no worker claims any more are replayed from their
+checkpoint. Either way an entry is applied exactly once.
+
+Entries MySQL rejects for good (a deleted student, a value the schema
+does not accept) are appended to DEAD_LETTER_FILE in the journal
+directory instead of being retried, so they cannot hold up the entries
+behind them. Lost connections, timeouts and deadlocks are retried.
+"""
+import glob
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from mysql.connector import Error, InterfaceError, OperationalError
+
+import database
+from summaries import RECORD_ATTEMPTS_SQL, summary_rows
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process journal locking
+    fcntl = None
+
+ATTEMPT_WRITE_MODE = os.getenv('ATTEMPT_WRITE_MODE', 'sync')
+ATTEMPT_JOURNAL_DIR = os.getenv('ATTEMPT_JOURNAL_DIR', 'journal')
+JOURNAL_BATCH_SIZE = int(os.getenv('ATTEMPT_JOURNAL_BATCH_SIZE', 500))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv('ATTEMPT_JOURNAL_FLUSH_INTERVAL', 0.5))
+
+# Rewrite the journal file once everything in it is flushed and it is this big
+JOURNAL_COMPACT_BYTES = 16 * 1024 * 1024
+RETRY_DELAY = 5.0
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+NODE_ID_FILE = 'node-id'
+# Lock wait timeout and deadlock: the same write can succeed on a later try
+RETRYABLE_ERRNOS = (1205, 1213)
+MAX_RETRY_DELAY = 60.0
+
+
+class JournalFile:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = open(path, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            # Raises BlockingIOError if another live process owns this journal
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.file.close()
+                raise
+
+    def read_entries(self):
+        self.file.seek(0)
+        entries = []
+        for line in self.file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash mid-write was never acknowledged
+                break
+        return entries
+
+    def append(self, entry):
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def truncate(self):
+        self.file.truncate(0)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self, remove=False):
+        self.file.close()
+        if remove:
+            os.remove(self.path)
+
+
+def node_name(directory):
+    """<host>-<node>: the node part is created once and kept in the directory."""
+    path = os.path.join(directory, NODE_ID_FILE)
+    if not os.path.exists(path):
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(uuid.uuid4().hex[:12])
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(temp, path)  # Atomic: the first worker to get here wins
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp)
+    with open(path, encoding='utf-8') as f:
+        node = f.read().strip()
+    # Keeps the name within AttemptJournalCheckpoint.JournalName
+    host = re.sub(r'[^A-Za-z0-9.-]', '_', socket.gethostname())[:48]
+    return f"{host}-{node}"
+
+
+def _checkpoint(cursor, journal_name):
+    cursor.execute("SELECT LastSeq FROM AttemptJournalCheckpoint WHERE JournalName = %s", (journal_name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _set_checkpoint(cursor, journal_name, seq):
+    cursor.execute("""
+        INSERT INTO AttemptJournalCheckpoint (JournalName, LastSeq) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE LastSeq = VALUES(LastSeq)
+    """, (journal_name, seq))
+
+
+def _write_batch(conn, journal_name, entries):
+    """Persist journal entries and advance the journal's checkpoint, atomically."""
+    cursor = conn.cursor()
+    try:
+        done = _checkpoint(cursor, journal_name)
+        entries = [entry for entry in entries if entry['seq'] > done]
+        if entries:
+            # One multi-row INSERT: InnoDB gives its rows consecutive AttemptIDs
+            # starting at lastrowid (auto_increment_increment = 1, the default)
+            cursor.execute("INSERT INTO QuizAttempt (StudentID, SubjectID, Score, AttemptTimestamp) VALUES "
+                           + ", ".join(["(%s, %s, %s, %s)"] * len(entries)),
+                           [value for entry in entries
+                            for value in (entry['student_id'], entry['subject_id'], entry['score'], entry['ts'])])
+            first_id = cursor.lastrowid
+            question_rows = [(first_id + index, qid, answer)
+                             for index, entry in enumerate(entries) for qid, answer in entry['answers']]
+            if question_rows:
+                cursor.executemany("INSERT INTO QuestionAttempt (AttemptID, QuestionID, StudentAnswer) VALUES (%s, %s, %s)",
+                                   question_rows)
+            cursor.executemany(RECORD_ATTEMPTS_SQL, summary_rows(
+                (entry['student_id'], entry['subject_id'], entry['score'], entry['ts']) for entry in entries))
+            _set_checkpoint(cursor, journal_name, entries[-1]['seq'])
+        conn.commit()
+        return len(entries)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _retryable(error):
+    """Whether a failed write may succeed later as it is: lost connections,
+    timeouts, deadlocks. Anything else is a problem with the entry itself."""
+    return isinstance(error, (OperationalError, InterfaceError)) or \
+        (isinstance(error, Error) and error.errno in RETRYABLE_ERRNOS)
+
+
+def _dead_letter(path, entry, error):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'entry': entry, 'error': repr(error),
+                            'at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, default=str) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_entries(conn, journal_name, entries, dead_letter_path):
+    """Like _write_batch, but sets aside entries that can never be written.
+
+    A single bad entry (e.g. its student was deleted in the meantime, or
+    an answer the schema rejects) must not block the rest of the journal
+    forever. After a non-retryable failure the batch is written one entry
+    at a time; entries that still fail are appended to the dead-letter
+    file and the checkpoint moves past them. Retryable errors propagate,
+    so the whole batch is tried again later. Returns (written, dropped).
+    """
+    try:
+        return _write_batch(conn, journal_name, entries), 0
+    except Exception as e:
+        if _retryable(e):
+            raise
+    written = dropped = 0
+    for entry in entries:
+        try:
+            written += _write_batch(conn, journal_name, [entry])
+        except Exception as e:
+            if _retryable(e):
+                raise
+            print(f"Moving journaled quiz attempt {entry.get('seq')} to {dead_letter_path}: {e!r}")
+            _dead_letter(dead_letter_path, entry, e)
+            dropped += 1
+            cursor = conn.cursor()
+            _set_checkpoint(cursor, journal_name, entry['seq'])
+            conn.commit()
+            cursor.close()
+    return written, dropped
+
+
+class AttemptJournal:
+    def __init__(self, directory, batch_size=500, flush_interval=0.5):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = None
+        self.dead_letter_path = os.path.join(directory, DEAD_LETTER_FILE)
+        self._pending = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.appended = 0
+        self.flushed = 0
+        self.replayed = 0
+        self.flush_batches = 0
+        self.flush_failures = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_time_total = 0.0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal = self._claim(node_name(self.directory))
+        self._replay_orphans()
+        with database.db_connection() as conn:
+            cursor = conn.cursor()
+            self._seq = _checkpoint(cursor, self.journal.name)
+            cursor.close()
+        # Entries the previous holder of this slot did not flush
+        self._pending = [entry for entry in self.journal.read_entries() if entry['seq'] > self._seq]
+        if self._pending:
+            self._seq = self._pending[-1]['seq']
+        self._thread = threading.Thread(target=self._run, name="attempt-journal", daemon=True)
+        self._thread.start()
+
+    def _claim(self, node):
+        """Open the journal of the lowest slot no running worker holds."""
+        if fcntl is None:
+            # Without file locks a slot cannot be told free from taken
+            return JournalFile(os.path.join(self.directory, f"attempts-{node}-p{os.getpid()}.jsonl"))
+        slot = 0
+        while True:
+            try:
+                return JournalFile(os.path.join(self.directory, f"attempts-{node}-{slot}.jsonl"))
+            except BlockingIOError:
+                slot += 1
+
+    def _replay_orphans(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, "attempts-*.jsonl"))):
+            if path == self.journal.path:
+                continue
+            try:
+                orphan = JournalFile(path)
+            except BlockingIOError:
+                continue  # owned by a running worker
+            try:
+                entries = orphan.read_entries()
+                with database.db_connection() as conn:
+                    for start in range(0, len(entries), self.batch_size):
+                        written, dropped = _write_entries(conn, orphan.name, entries[start:start + self.batch_size],
+                                                          self.dead_letter_path)
+                        self.replayed += written
+                        self.dropped += dropped
+                    cursor = conn.cursor()
+                    cursor.execute("DELETE FROM AttemptJournalCheckpoint WHERE JournalName = %s", (orphan.name,))
+                    conn.commit()
+                    cursor.close()
+            except Exception:
+                orphan.close()
+                raise
+            orphan.close(remove=True)
+            print(f"Replayed {len(entries)} journaled quiz attempts from {orphan.name}")
+
+    def append(self, student_id, subject_id, score, answers, attempted_at):
+        with self._cond:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'student_id': student_id,
+                'subject_id': subject_id,
+                'score': score,
+                'answers': [[qid, answer] for qid, answer in answers.items()],
+                'ts': attempted_at.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            try:
+                self.journal.append(entry)
+            except OSError:
+                self._seq -= 1
+                raise
+            self._pending.append(entry)
+            self.appended += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while True:
+            with self._cond:
+                # Give submissions a moment to accumulate into one larger batch
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = self._pending[:self.batch_size]
+            if self._flush(batch):
+                delay = RETRY_DELAY
+            else:
+                if self._stopping:
+                    return
+                time.sleep(delay)
+                delay = min(2 * delay, MAX_RETRY_DELAY)
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            with database.db_connection() as conn:
+                written, dropped = _write_entries(conn, self.journal.name, batch, self.dead_letter_path)
+        except Exception as e:
+            # Anything, not only database errors: the thread has to survive to retry
+            self.flush_failures += 1
+            print(f"Failed to flush {len(batch)} journaled quiz attempts: {e!r}")
+            return False
+        elapsed = 1000 * (time.perf_counter() - started)
+        with self._cond:
+            del self._pending[:len(batch)]
+            self.flushed += written
+            self.dropped += dropped
+            self.flush_batches += 1
+            self.last_flush_ms = round(elapsed, 3)
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self._flush_time_total += elapsed
+            if not self._pending and self.journal.size() > JOURNAL_COMPACT_BYTES:
+                self.journal.truncate()
+        return True
+
+    def stop(self, timeout=30):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        with self._cond:
+            drained = not self._pending
+        # Keep the file when entries are still pending so the next start replays them
+        if drained:
+            try:
+                with database.db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("DELETE FROM AttemptJournalCheckpoint WHERE JournalName = %s", (self.journal.name,))
+                    conn.commit()
+                    cursor.close()
+            except Error:
+                drained = False
+        self.journal.close(remove=drained)
+        self._thread = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "mode": "write_behind",
+                "queue_depth": len(self._pending),
+                "appended": self.appended,
+                "flushed": self.flushed,
+                "replayed": self.replayed,
+                "flush_batches": self.flush_batches,
+                "flush_failures": self.flush_failures,
+                "dropped": self.dropped,
+                "last_flush_ms": self.last_flush_ms,
+                "max_flush_ms": self.max_flush_ms,
+                "avg_flush_ms": round(self._flush_time_total / self.flush_batches, 3) if self.flush_batches else 0.0,
+            }
+
+
+attempt_journal = None
+if ATTEMPT_WRITE_MODE == 'write_behind':
+    attempt_journal = AttemptJournal(ATTEMPT_JOURNAL_DIR, JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_INTERVAL)
+elif ATTEMPT_WRITE_MODE != 'sync':
+    raise ValueError(f"Unknown ATTEMPT_WRITE_MODE {ATTEMPT_WRITE_MODE!r}, expected 'sync' or 'write_behind'")
+
+
+def journal_stats():
+    return attempt_journal.stats() if attempt_journal else {"mode": "sync"}
@@ -0,0 +1,271 @@
+"""End-to-end load test for the student quiz flow.
+
+Creates a scratch database on the MySQL server from DB_CONFIG, loads
+SQL/quizsystem.sql plus the migrations and a configurable amount of
+synthetic data, serves main.app with uvicorn in this process and drives
+concurrent login -> get_quiz -> submit_quiz -> get_results sessions.
+
+    python benchmark.py --students 2000 --questions 200 --concurrency 50 --sessions 2000
+    python benchmark.py --backend async --output async.json --compare sync.json
+
+Latency percentiles, requests/sec and MySQL queries per request are
+printed and written to the --output JSON file. The scratch database is
+dropped and recreated on every run, so point it at a disposable server.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SQL', 'quizsystem.sql')
+ENDPOINTS = ["login", "get_quiz", "submit_quiz", "get_results"]
+SEED_CHUNK = 1000
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def schema_statements():
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        lines = [line for line in f.read().splitlines() if not line.strip().startswith('--')]
+    for statement in '\n'.join(lines).split(';\n'):
+        statement = statement.strip().rstrip(';')
+        # The scratch database is created and selected by seed_database()
+        if statement and not statement.upper().startswith(('CREATE DATABASE', 'USE ')):
+            yield statement
+
+
+def seed_database(config, name, students, questions_per_subject):
+    import database
+    from migrate import apply_migrations
+    from summaries import rebuild_summaries
+
+    server = {key: value for key, value in config.items() if key != 'database'}
+    conn = mysql.connector.connect(**server)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+    cursor.execute(f"CREATE DATABASE `{name}`")
+    cursor.execute(f"USE `{name}`")
+    for statement in schema_statements():
+        cursor.execute(statement)
+    conn.commit()
+
+    from passwords import hash_password
+    # One hash shared by every synthetic student: seeding stays fast and
+    # logins measure verification, not the one-off rehash of plaintext
+    password_hash = hash_password("Student@123")
+    student_rows = [(1000 + i, f"Bench Student {i}", password_hash) for i in range(students)]
+    for start in range(0, len(student_rows), SEED_CHUNK):
+        cursor.executemany("INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)",
+                           student_rows[start:start + SEED_CHUNK])
+    cursor.execute("SELECT SubjectID FROM Subject")
+    subject_ids = [row[0] for row in cursor.fetchall()]
+    question_rows = [
+        (subject_id, f"Synthetic question {n} for subject {subject_id}", "A1", "B1", "C1", "D1",
+         random.choice("ABCD"), random.choice(("Easy", "Medium", "Hard")))
+        for subject_id in subject_ids for n in range(questions_per_subject)
+    ]
+    for start in range(0, len(question_rows), SEED_CHUNK):
+        cursor.executemany("""
+            INSERT INTO Question (SubjectID, QuestionText, OptionA, OptionB, OptionC, OptionD, CorrectOption, Difficulty)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, question_rows[start:start + SEED_CHUNK])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    with database.db_connection() as pooled:
+        apply_migrations(pooled, log=lambda message: None)
+        rebuild_summaries(pooled)
+    return [row[0] for row in student_rows], subject_ids
+
+
+def server_query_count(config):
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    count = int(cursor.fetchone()[1])
+    cursor.close()
+    conn.close()
+    return count
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+class Client:
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.quiz_session = None
+        self.token = None
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        self.quiz_session = response.getheader("X-Quiz-Session", self.quiz_session)
+        data = json.loads(data) if data else None
+        if isinstance(data, dict) and "token" in data:
+            self.token = data["token"]
+        return response.status, data
+
+
+def run_session(port, student_id, subject_ids, samples, lock):
+    client = Client(port)
+    timings = []
+    errors = 0
+    subject_id = random.choice(subject_ids)
+    steps = [
+        ("login", "POST", "/api/auth/login/student", lambda _: {"id": student_id, "password": "Student@123"}),
+        ("get_quiz", "GET", f"/api/student/quiz/{subject_id}?student_id={student_id}", lambda _: None),
+        ("submit_quiz", "POST", "/api/student/quiz/submit", lambda quiz: {
+            "session_id": client.quiz_session,
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "answers": [{"question_id": q["id"], "answer": random.choice("ABCD")} for q in quiz or []],
+        }),
+        ("get_results", "GET", f"/api/student/results/{student_id}", lambda _: None),
+    ]
+    previous = None
+    for name, method, path, payload in steps:
+        started = time.perf_counter()
+        try:
+            status, previous = client.request(method, path, payload(previous))
+        except (OSError, http.client.HTTPException, ValueError):
+            status, previous = 0, None
+        timings.append((name, time.perf_counter() - started))
+        if status != 200:
+            errors += 1
+            break
+    client.conn.close()
+    with lock:
+        for name, elapsed in timings:
+            samples[name].append(elapsed)
+    return errors
+
+
+def summarize(samples, wall_time, queries, errors):
+    total_requests = sum(len(values) for values in samples.values())
+    report = {
+        "requests": total_requests,
+        "errors": errors,
+        "wall_time_s": round(wall_time, 3),
+        "requests_per_s": round(total_requests / wall_time, 1) if wall_time else 0.0,
+        "db_queries_per_request": round(queries / total_requests, 2) if total_requests else 0.0,
+        "endpoints": {},
+    }
+    for name in ENDPOINTS:
+        values = sorted(samples[name])
+        report["endpoints"][name] = {
+            "count": len(values),
+            "p50_ms": round(1000 * percentile(values, 50), 2),
+            "p95_ms": round(1000 * percentile(values, 95), 2),
+            "p99_ms": round(1000 * percentile(values, 99), 2),
+        }
+    return report
+
+
+def print_report(report, baseline=None):
+    print(f"requests: {report['requests']}  errors: {report['errors']}  "
+          f"req/s: {report['requests_per_s']}  db queries/request: {report['db_queries_per_request']}")
+    print(f"{'endpoint':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["endpoints"].items():
+        line = f"{name:<14}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        if baseline and name in baseline.get("endpoints", {}):
+            before = baseline["endpoints"][name]["p95_ms"]
+            if before:
+                line += f"   p95 {100 * (stats['p95_ms'] - before) / before:+.1f}% vs baseline"
+        print(line)
+    if baseline and baseline.get("requests_per_s"):
+        change = 100 * (report["requests_per_s"] - baseline["requests_per_s"]) / baseline["requests_per_s"]
+        print(f"req/s {change:+.1f}% vs baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="quizsystem_bench", help="scratch database to (re)create")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=100, help="questions per subject")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--backend", choices=["sync", "async"], default=os.getenv("DB_BACKEND", "sync"))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # database.py and database_async.py read these at import time
+    os.environ["MYSQLDATABASE"] = args.database
+    os.environ["DB_BACKEND"] = args.backend
+    import database
+
+    print(f"Seeding {args.database}: {args.students} students, {args.questions} questions per subject")
+    student_ids, subject_ids = seed_database(database.DB_CONFIG, args.database, args.students, args.questions)
+
+    port = free_port()
+    server, thread = start_server(port)
+    samples = {name: [] for name in ENDPOINTS}
+    lock = threading.Lock()
+
+    queries_before = server_query_count(database.DB_CONFIG)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_session, port, random.choice(student_ids), subject_ids, samples, lock)
+            for _ in range(args.sessions)
+        ]
+        errors = sum(future.result() for future in futures)
+    wall_time = time.perf_counter() - started
+    # Subtract the two status queries issued by this script itself
+    queries = server_query_count(database.DB_CONFIG) - queries_before - 2
+
+    server.should_exit = True
+    thread.join(timeout=10)
+
+    report = summarize(samples, wall_time, queries, errors)
+    report["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, "w", encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
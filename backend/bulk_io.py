@@ -0,0 +1,76 @@
+"""Helpers for the bulk upload/download endpoints.
+
+Uploads may be CSV (header row required), NDJSON/JSON Lines (one object
+per line) or a JSON array. CSV and NDJSON are read incrementally from the
+spooled upload file, so large files are never held in memory at once.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+BULK_CHUNK_SIZE = 500
+
+
+class UploadFormatError(ValueError):
+    pass
+
+
+def upload_format(upload):
+    name = (upload.filename or '').lower()
+    content_type = (upload.content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return 'ndjson'
+    if name.endswith('.json') or 'json' in content_type:
+        return 'json'
+    raise UploadFormatError("Unsupported file type, expected .csv, .json or .ndjson")
+
+
+def iter_upload_records(upload):
+    """Yield (row_number, record) pairs, where record is a dict or an error string."""
+    fmt = upload_format(upload)
+    upload.file.seek(0)
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            # Row 1 is the header
+            for number, row in enumerate(csv.DictReader(text), start=2):
+                yield number, {key.strip(): (value.strip() if isinstance(value, str) else value)
+                               for key, value in row.items() if key}
+        elif fmt == 'ndjson':
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, f"Invalid JSON: {e}"
+                    continue
+                yield number, record if isinstance(record, dict) else "Expected a JSON object"
+        else:
+            try:
+                records = json.load(text)
+            except ValueError as e:
+                raise UploadFormatError(f"Invalid JSON: {e}")
+            if not isinstance(records, list):
+                raise UploadFormatError("Expected a JSON array of objects")
+            for number, record in enumerate(records, start=1):
+                yield number, record if isinstance(record, dict) else "Expected a JSON object"
+    finally:
+        text.detach()
+
+
+def chunked(iterable, size=BULK_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validation_message(error):
+    # Compact one-line form of a pydantic ValidationError
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
@@ -0,0 +1,245 @@
+"""Cache invalidation across API workers.
+
+Every write that affects a process-local cache bumps a version row in
+the CacheVersion table, inside the write's own transaction:
+
+    versions = cache_bus.bump(cursor, cache_key("questions", subject_id))
+    conn.commit()
+    cache_bus.publish(versions)
+
+publish() evicts the affected entries in this worker at once. Every
+worker also polls CacheVersion (one query over a few rows) each
+CACHE_BUS_POLL_INTERVAL seconds and evicts the keys whose version moved,
+so a write made anywhere is seen everywhere within about one interval.
+
+With CACHE_BUS_SOCKET_DIR set, workers on the same host also push each
+bump to each other over Unix datagram sockets in that directory, which
+usually cuts the delay to milliseconds. Polling still runs underneath and
+catches anything a push missed. Other transports only need start(),
+publish() and stop().
+
+Keys are "resource" or "resource:argument". Caches register a handler
+per resource with subscribe(); it receives the argument, or None.
+
+    python cache_bus.py bump subjects      # after editing tables by hand
+"""
+import glob
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import database
+
+CACHE_BUS_POLL_INTERVAL = float(os.getenv('CACHE_BUS_POLL_INTERVAL', 1.0))
+CACHE_BUS_SOCKET_DIR = os.getenv('CACHE_BUS_SOCKET_DIR')
+
+# LAST_INSERT_ID(expr) hands the new version back in cursor.lastrowid
+BUMP_SQL = """
+    INSERT INTO CacheVersion (CacheKey, Version) VALUES (%s, LAST_INSERT_ID(1))
+    ON DUPLICATE KEY UPDATE Version = LAST_INSERT_ID(Version + 1)
+"""
+VERSIONS_QUERY = "SELECT CacheKey, Version FROM CacheVersion"
+
+
+def cache_key(resource, argument=None):
+    return resource if argument is None else f"{resource}:{argument}"
+
+
+class UnixSocketTransport:
+    """Pushes bumps to the other workers on this host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.sock")
+        self._sock = None
+        self._thread = None
+        self.sent = 0
+        self.received = 0
+
+    def start(self, on_message):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._thread = threading.Thread(target=self._receive, args=(on_message,), name="cache-bus-socket", daemon=True)
+        self._thread.start()
+
+    def _receive(self, on_message):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return  # Closed by stop()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            self.received += 1
+            on_message(message)
+
+    def publish(self, versions):
+        if self._sock is None:
+            return
+        data = json.dumps(versions).encode()
+        for path in glob.glob(os.path.join(self.directory, "worker-*.sock")):
+            if path == self.path:
+                continue
+            try:
+                self._sock.sendto(data, path)
+                self.sent += 1
+            except ConnectionRefusedError:
+                # Left behind by a worker that exited without cleaning up
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                pass  # Full or going away: polling picks it up
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class CacheBus:
+    def __init__(self, poll_interval=1.0, transport=None):
+        self.poll_interval = poll_interval
+        self.transport = transport
+        self._handlers = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.poll_errors = 0
+        self.evictions = 0
+        self.last_poll = None
+
+    def subscribe(self, resource, handler):
+        self._handlers.setdefault(resource, []).append(handler)
+
+    def bump(self, cursor, *keys):
+        """Bump keys inside the caller's transaction; pass the result to publish() after commit."""
+        versions = {}
+        for key in keys:
+            cursor.execute(BUMP_SQL, (key,))
+            versions[key] = cursor.lastrowid
+        return versions
+
+    def publish(self, versions):
+        self.apply(versions)
+        if self.transport is not None:
+            self.transport.publish(versions)
+
+    def apply(self, versions):
+        """Evict every key whose version is newer than the one last seen here."""
+        changed = []
+        with self._lock:
+            for key, version in versions.items():
+                if version > self._versions.get(key, 0):
+                    self._versions[key] = version
+                    changed.append(key)
+        for key in changed:
+            self._evict(key)
+
+    def _evict(self, key):
+        resource, _, argument = key.partition(":")
+        for handler in self._handlers.get(resource, ()):
+            try:
+                handler(argument or None)
+            except Exception as e:
+                print(f"Cache bus handler for {key} failed: {e}")
+        with self._lock:
+            self.evictions += 1
+
+    def poll(self, evict=True):
+        with database.db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(VERSIONS_QUERY)
+                versions = dict(cursor.fetchall())
+            finally:
+                cursor.close()
+        if evict:
+            self.apply(versions)
+        else:
+            with self._lock:
+                self._versions.update(versions)
+        self.polls += 1
+        self.last_poll = time.time()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.poll_errors += 1
+                print(f"Cache bus poll failed: {e}")
+
+    def start(self):
+        try:
+            # Nothing is cached yet: only remember the current versions
+            self.poll(evict=False)
+        except Exception as e:
+            self.poll_errors += 1
+            print(f"Cache bus poll failed: {e}")
+        if self.transport is not None:
+            self.transport.start(self.apply)
+        if self.poll_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.transport is not None:
+            self.transport.stop()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "keys": len(self._versions),
+                "polls": self.polls,
+                "poll_errors": self.poll_errors,
+                "evictions": self.evictions,
+                "poll_interval_seconds": self.poll_interval,
+                "seconds_since_poll": round(time.time() - self.last_poll, 3) if self.last_poll else None,
+            }
+        if self.transport is not None:
+            stats["pushes_sent"] = self.transport.sent
+            stats["pushes_received"] = self.transport.received
+        return stats
+
+
+cache_bus = CacheBus(CACHE_BUS_POLL_INTERVAL,
+                     UnixSocketTransport(CACHE_BUS_SOCKET_DIR) if CACHE_BUS_SOCKET_DIR else None)
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] != "bump":
+        print("usage: python cache_bus.py bump <key> [<key> ...]")
+        return 2
+    with database.db_connection() as conn:
+        cursor = conn.cursor()
+        versions = cache_bus.bump(cursor, *argv[1:])
+        conn.commit()
+        cursor.close()
+    for key, version in versions.items():
+        print(f"{key}: version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
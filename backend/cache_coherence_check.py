@@ -0,0 +1,196 @@
+"""Checks that caches stay coherent across several API workers.
+
+Creates a scratch database like benchmark.py, starts --workers separate
+uvicorn processes on it (each with its own process-local caches, as
+under gunicorn) and then repeatedly writes through one worker:
+
+- an instructor adds a question; every other worker must report the new
+  question count for the subject
+- an admin adds an instructor; every other worker must stop answering
+  304 to the instructor list's previous ETag
+
+For each write it measures how long each other worker kept serving the
+old data. The check fails if any staleness exceeds --bound seconds
+(default: twice the poll interval plus half a second).
+
+    python cache_coherence_check.py --workers 3 --writes 20
+    python cache_coherence_check.py --workers 3 --socket-dir /tmp/quiz-cache-bus
+
+The scratch database is dropped and recreated on every run, so point it
+at a disposable server.
+"""
+import argparse
+import http.client
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark import free_port, seed_database
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def request(port, method, path, payload=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        headers = dict(headers or {})
+        if body:
+            headers["Content-Type"] = "application/json"
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, {name.lower(): value for name, value in response.getheaders()}, json.loads(data) if data else None
+    finally:
+        conn.close()
+
+
+def start_workers(count, env):
+    workers = []
+    for _ in range(count):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env)
+        workers.append((port, process))
+    deadline = time.monotonic() + 60
+    for port, process in workers:
+        while True:
+            try:
+                if request(port, "GET", "/")[0] == 200:
+                    break
+            except OSError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Worker on port {port} did not start")
+            time.sleep(0.2)
+    return workers
+
+
+def wait_until(check, since, timeout):
+    """Seconds from `since` until check() is true, or None after timeout."""
+    while time.monotonic() - since < timeout:
+        if check():
+            return time.monotonic() - since
+        time.sleep(0.01)
+    return None
+
+
+def question_count(port, token, subject_id):
+    status, headers, _ = request(port, "GET", f"/api/instructor/questions/{subject_id}?limit=1",
+                                 headers={"Authorization": f"Bearer {token}"})
+    return int(headers["x-total-count"]) if status == 200 else None
+
+
+def instructors_etag(port, token):
+    return request(port, "GET", "/api/admin/instructors", headers={"Authorization": f"Bearer {token}"})[1]["etag"]
+
+
+def login(port, role, user_id, password):
+    status, _, body = request(port, "POST", f"/api/auth/login/{role}", {"id": user_id, "password": password})
+    if status != 200:
+        raise RuntimeError(f"{role} login failed: {status} {body}")
+    return body
+
+
+def check_questions(workers, writer, token, subject_id, timeout):
+    before = question_count(workers[writer][0], token, subject_id)
+    for port, _ in workers:
+        question_count(port, token, subject_id)  # make sure every worker has the bank cached
+    status, _, body = request(workers[writer][0], "POST", "/api/instructor/question/add", {
+        "subject_id": subject_id, "text": f"Coherence check {secrets.token_hex(4)}",
+        "option_a": "A", "option_b": "B", "option_c": "C", "option_d": "D",
+        "correct_option": "A", "difficulty": "Easy",
+    }, headers={"Authorization": f"Bearer {token}"})
+    if status != 200:
+        raise RuntimeError(f"Adding a question failed: {status} {body}")
+    written = time.monotonic()
+    return [wait_until(lambda: question_count(port, token, subject_id) == before + 1, written, timeout)
+            for index, (port, _) in enumerate(workers) if index != writer]
+
+
+def check_instructors(workers, writer, token, timeout):
+    etags = {port: instructors_etag(port, token) for port, _ in workers}
+    status, _, body = request(workers[writer][0], "POST", "/api/admin/instructor/add", {
+        "name": f"Coherence {secrets.token_hex(3)}", "subject_name": "English", "password": "Proff@123",
+    }, headers={"Authorization": f"Bearer {token}"})
+    if status != 200:
+        raise RuntimeError(f"Adding an instructor failed: {status} {body}")
+    written = time.monotonic()
+
+    def refreshed(port):
+        return request(port, "GET", "/api/admin/instructors",
+                       headers={"Authorization": f"Bearer {token}", "If-None-Match": etags[port]})[0] == 200
+
+    return [wait_until(lambda: refreshed(port), written, timeout)
+            for index, (port, _) in enumerate(workers) if index != writer]
+
+
+def summarize(name, delays, bound):
+    measured = [delay for delay in delays if delay is not None]
+    missed = len(delays) - len(measured)
+    over = sum(1 for delay in measured if delay > bound) + missed
+    if measured:
+        print(f"{name:<12}{len(delays):>8}{1000 * statistics.median(measured):>10.0f}"
+              f"{1000 * max(measured):>10.0f}{over:>8}")
+    else:
+        print(f"{name:<12}{len(delays):>8}{'-':>10}{'-':>10}{over:>8}")
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="quizsystem_coherence", help="scratch database to (re)create")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=20, help="writes of each kind")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="CACHE_BUS_POLL_INTERVAL of the workers")
+    parser.add_argument("--socket-dir", help="CACHE_BUS_SOCKET_DIR of the workers, to test push delivery")
+    parser.add_argument("--bound", type=float, help="allowed staleness in seconds")
+    args = parser.parse_args()
+    if args.workers < 2:
+        parser.error("--workers must be at least 2")
+    bound = args.bound if args.bound is not None else 2 * args.poll_interval + 0.5
+
+    os.environ["MYSQLDATABASE"] = args.database
+    import database
+
+    print(f"Seeding {args.database}")
+    seed_database(database.DB_CONFIG, args.database, students=10, questions_per_subject=10)
+
+    env = dict(os.environ, MYSQLDATABASE=args.database, TOKEN_KEYS=f"check:{secrets.token_hex(16)}",
+               CACHE_BUS_POLL_INTERVAL=str(args.poll_interval), METRICS_ENABLED="0", SLOW_QUERY_MS="0")
+    if args.socket_dir:
+        env["CACHE_BUS_SOCKET_DIR"] = args.socket_dir
+    else:
+        env.pop("CACHE_BUS_SOCKET_DIR", None)
+
+    print(f"Starting {args.workers} workers (poll interval {args.poll_interval}s"
+          f"{', push via ' + args.socket_dir if args.socket_dir else ''}), bound {bound}s")
+    workers = start_workers(args.workers, env)
+    try:
+        instructor = login(workers[0][0], "instructor", 1, "Proff@123")
+        admin = login(workers[0][0], "admin", 111, "Admin@123")
+        question_delays, instructor_delays = [], []
+        for write in range(args.writes):
+            writer = write % len(workers)
+            question_delays += check_questions(workers, writer, instructor["token"], instructor["subject_id"], 3 * bound)
+            instructor_delays += check_instructors(workers, writer, admin["token"], 3 * bound)
+    finally:
+        for _, process in workers:
+            process.terminate()
+        for _, process in workers:
+            process.wait(timeout=10)
+
+    print(f"\n{'write':<12}{'reads':>8}{'p50 ms':>10}{'max ms':>10}{'> bound':>8}")
+    failures = summarize("question", question_delays, bound) + summarize("instructor", instructor_delays, bound)
+    print("OK: staleness stayed within the bound" if not failures else f"FAILED: {failures} reads over the bound")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Awaitable data access for the async route handlers.
+
+Two interchangeable backends implement the same small API:
+
+- "async": aiomysql with its own connection pool, all I/O on the event loop.
+- "sync":  the pooled mysql.connector connections from database.py, with
+           each blocking call pushed onto the threadpool.
+
+DB_BACKEND selects one at startup so both can be load-tested against the
+same handlers.
+
+fetchall() and fetchone() take an intent like database.get_db_connection():
+with intent=READ the "sync" backend may answer from a replica. The "async"
+backend always uses the primary.
+"""
+import os
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from mysql.connector import Error
+from starlette.concurrency import run_in_threadpool
+
+import database
+from database import WRITE
+import metrics
+
+DB_BACKEND = os.getenv('DB_BACKEND', 'sync')
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+def _instrument(cursor):
+    return metrics.InstrumentedAsyncCursor(cursor) if metrics.instrument_queries() else cursor
+
+
+class ThreadedCursor:
+    """Awaitable facade over a blocking mysql.connector cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, query, params=None):
+        await run_in_threadpool(self._cursor.execute, query, params)
+
+    async def executemany(self, query, seq_params):
+        await run_in_threadpool(self._cursor.executemany, query, seq_params)
+
+    async def fetchone(self):
+        return await run_in_threadpool(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await run_in_threadpool(self._cursor.fetchall)
+
+
+class ThreadedDatabase:
+    name = "sync"
+
+    def _acquire(self, intent=WRITE):
+        try:
+            return database.acquire(intent)
+        except Error as e:
+            print(f"Error connecting to MySQL Database: {e}")
+            raise DatabaseUnavailable(str(e))
+
+    def _query(self, query, params, one, intent):
+        conn = self._acquire(intent)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            result = cursor.fetchone() if one else cursor.fetchall()
+            cursor.close()
+            return result
+        finally:
+            conn.close()
+
+    async def fetchall(self, query, params=None, intent=WRITE):
+        return await run_in_threadpool(self._query, query, params, False, intent)
+
+    async def fetchone(self, query, params=None, intent=WRITE):
+        return await run_in_threadpool(self._query, query, params, True, intent)
+
+    @asynccontextmanager
+    async def transaction(self):
+        conn = await run_in_threadpool(self._acquire)
+        cursor = conn.cursor()
+        try:
+            yield ThreadedCursor(cursor)
+            await run_in_threadpool(conn.commit)
+        except BaseException:
+            await run_in_threadpool(conn.rollback)
+            raise
+        finally:
+            cursor.close()
+            await run_in_threadpool(conn.close)
+
+    async def close(self):
+        pass
+
+
+class AiomysqlDatabase:
+    name = "async"
+
+    def __init__(self, config, pool_config):
+        self.config = config
+        self.pool_config = pool_config
+        self._pool = None
+        self._lock = None
+
+    async def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+        import aiomysql
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pool is None:
+                try:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.config['host'],
+                        port=self.config['port'],
+                        user=self.config['user'],
+                        password=self.config['password'],
+                        db=self.config['database'],
+                        connect_timeout=self.config.get('connect_timeout', 60),
+                        minsize=1,
+                        maxsize=self.pool_config['size'] + self.pool_config['max_overflow'],
+                        pool_recycle=self.pool_config['recycle'],
+                        autocommit=False,
+                    )
+                except Exception as e:
+                    print(f"Error connecting to MySQL Database: {e}")
+                    raise DatabaseUnavailable(str(e))
+        return self._pool
+
+    @asynccontextmanager
+    async def _connection(self):
+        pool = await self._get_pool()
+        started = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), timeout=self.pool_config['timeout'])
+        except Exception as e:
+            print(f"Error connecting to MySQL Database: {e}")
+            if metrics.METRICS_ENABLED:
+                metrics.db_checkout_errors.inc("async")
+            raise DatabaseUnavailable(str(e))
+        if metrics.METRICS_ENABLED:
+            metrics.db_checkout_duration.observe(time.perf_counter() - started, "async")
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    async def fetchall(self, query, params=None, intent=WRITE):
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await _instrument(cursor).execute(query, params)
+                rows = await cursor.fetchall()
+            await conn.rollback()
+            return rows
+
+    async def fetchone(self, query, params=None, intent=WRITE):
+        async with self._connection() as conn:
+            async with conn.cursor() as cursor:
+                await _instrument(cursor).execute(query, params)
+                row = await cursor.fetchone()
+            await conn.rollback()
+            return row
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self._connection() as conn:
+            await conn.begin()
+            cursor = await conn.cursor()
+            try:
+                yield _instrument(cursor)
+                await conn.commit()
+                database.mark_write()
+            except BaseException:
+                await conn.rollback()
+                raise
+            finally:
+                await cursor.close()
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+def create_database(backend=DB_BACKEND):
+    if backend == "async":
+        return AiomysqlDatabase(database.DB_CONFIG, database.POOL_CONFIG)
+    if backend == "sync":
+        return ThreadedDatabase()
+    raise ValueError(f"Unknown DB_BACKEND {backend!r}, expected 'sync' or 'async'")
+
+
+db = create_database()
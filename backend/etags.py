@@ -0,0 +1,88 @@
+"""Conditional GET for read-mostly lists.
+
+Every cacheable resource has a version counter that the write handlers
+bump after they commit. A response's ETag is built from the process
+boot id, the resource version and the query string, so it can be
+computed, and If-None-Match answered with 304, before any database
+access.
+
+Versions are per process. Writes on other workers reach them through
+cache_bus.py within a poll interval; as a backstop each version also
+rolls over on its own after RESOURCE_VERSION_TTL seconds.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+
+from fastapi import Response
+
+RESOURCE_VERSION_TTL = float(os.getenv('RESOURCE_VERSION_TTL', 60))
+ETAG_CACHE_CONTROL = os.getenv('ETAG_CACHE_CONTROL', 'private, no-cache')
+
+BOOT_ID = secrets.token_hex(4)
+# Added by compression.py to the ETag of an encoded representation
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+class ResourceVersions:
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def bump(self, *resource):
+        with self._lock:
+            version = self._versions.get(resource, (0, 0.0))[0] + 1
+            self._versions[resource] = (version, time.monotonic())
+            self.bumps += 1
+
+    def version(self, *resource):
+        now = time.monotonic()
+        with self._lock:
+            version, since = self._versions.get(resource, (0, None))
+            if since is None or now - since > self.ttl:
+                version += 1
+                self._versions[resource] = (version, now)
+            return version
+
+    def stats(self):
+        with self._lock:
+            return {"resources": len(self._versions), "bumps": self.bumps, "ttl_seconds": self.ttl}
+
+
+resource_versions = ResourceVersions(RESOURCE_VERSION_TTL)
+
+
+def _opaque_tag(tag):
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+class Conditional:
+    """ETag handling for one request to a versioned resource."""
+
+    def __init__(self, request, *resource):
+        version = resource_versions.version(*resource)
+        variant = hashlib.blake2b(request.url.query.encode(), digest_size=6).hexdigest()
+        self.etag = f'"{BOOT_ID}-{version}-{variant}"'
+        if_none_match = request.headers.get("if-none-match")
+        self.not_modified = bool(if_none_match) and (
+            if_none_match.strip() == "*"
+            or _opaque_tag(self.etag) in (_opaque_tag(tag) for tag in if_none_match.split(","))
+        )
+
+    @property
+    def headers(self):
+        return {"ETag": self.etag, "Cache-Control": ETAG_CACHE_CONTROL}
+
+    def not_modified_response(self):
+        return Response(status_code=304, headers=self.headers)
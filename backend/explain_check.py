@@ -0,0 +1,86 @@
+"""Check that the hot router queries are served by an index.
+
+Runs EXPLAIN for each query below against the configured database and
+fails if any of them needs a full table scan of a table other than the
+small lookup tables. The queries are imported from the modules that send
+them, so the check follows the code. Run from the backend directory
+after migrating:
+
+    python explain_check.py
+"""
+import sys
+
+from database import get_db_connection
+from pagination import DEFAULT_PAGE_SIZE, count_query, like_prefix, page_query
+from question_bank import BANK_QUERY
+from item_analysis import ATTEMPT_ROWS_QUERY
+from quiz_generator import SEEN_QUERY
+from leaderboard import NEW_ATTEMPTS_QUERY
+from routers.auth import STUDENT_LOGIN_QUERY, INSTRUCTOR_LOGIN_QUERY, ADMIN_LOGIN_QUERY
+from routers.student import RESULTS_QUERY, SUMMARY_QUERY
+from routers.instructor import (GRADES_COUNT_QUERIES, GRADES_QUERIES, SUBJECT_STUDENTS_QUERY,
+                                SUBJECT_TOP_QUERY, SUBJECT_TOTALS_QUERY)
+from routers.admin import INSTRUCTORS_QUERY, STUDENTS_COUNT_QUERY, STUDENTS_QUERY
+
+# Tables that only ever hold a handful of rows; scanning them is fine
+SMALL_TABLES = {'Subject', 's', 'Admin'}
+
+# The routers' own SQL; paged lists are built by the same code as fetch_page
+CHECKED_QUERIES = [
+    ("auth.login_student", STUDENT_LOGIN_QUERY, (1,)),
+    ("auth.login_instructor", INSTRUCTOR_LOGIN_QUERY, (1,)),
+    ("auth.login_admin", ADMIN_LOGIN_QUERY, (111,)),
+    ("student.get_quiz (question bank)", BANK_QUERY, (1,)),
+    ("student.get_quiz (seen questions)", SEEN_QUERY, (1, 1)),
+    ("student.get_results", RESULTS_QUERY, (1, 1)),
+    ("student.get_summary", SUMMARY_QUERY, (1,)),
+    ("student.get_leaderboard (catch-up)", NEW_ATTEMPTS_QUERY, (0,)),
+    ("instructor.get_students", SUBJECT_STUDENTS_QUERY, (1, 1)),
+    ("instructor.get_subject_grades (count)", *count_query(GRADES_COUNT_QUERIES, ["qa.SubjectID = %s"], [1])),
+    ("instructor.get_subject_grades",
+     *page_query(GRADES_QUERIES, "qa.AttemptID", ["qa.SubjectID = %s"], [1], 0, DEFAULT_PAGE_SIZE + 1)),
+    ("instructor.get_item_analysis", ATTEMPT_ROWS_QUERY, (1, 0)),
+    ("instructor.get_subject_summary (totals)", SUBJECT_TOTALS_QUERY, (1,)),
+    ("instructor.get_subject_summary (top students)", SUBJECT_TOP_QUERY, (1, 10)),
+    ("admin.get_all_students (count)", *count_query(STUDENTS_COUNT_QUERY, ["SName LIKE %s"], [like_prefix("A")])),
+    ("admin.get_all_students",
+     *page_query(STUDENTS_QUERY, "StudentID", ["SName LIKE %s"], [like_prefix("A")], None, DEFAULT_PAGE_SIZE + 1)),
+    ("admin.get_all_students (next page)", *page_query(STUDENTS_QUERY, "StudentID", after_id=100,
+                                                       limit=DEFAULT_PAGE_SIZE + 1)),
+    ("admin.get_instructors", *page_query(INSTRUCTORS_QUERY, "i.InstructorID", after_id=0,
+                                          limit=DEFAULT_PAGE_SIZE + 1)),
+]
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def check_queries(conn):
+    failures = []
+    cursor = conn.cursor()
+    try:
+        for name, sql, params in CHECKED_QUERIES:
+            for step in explain(cursor, sql, params):
+                table = step.get('table')
+                # <derivedN> and <unionM,N> are the merged rows of steps checked on their own
+                if step.get('type') == 'ALL' and table not in SMALL_TABLES and not (table or '').startswith('<'):
+                    failures.append((name, table, step.get('rows')))
+                    print(f"FULL SCAN  {name}: table {table} (~{step.get('rows')} rows)")
+                else:
+                    print(f"ok         {name}: table {table} via {step.get('key') or step.get('type')}")
+    finally:
+        cursor.close()
+    return failures
+
+
+if __name__ == "__main__":
+    conn = get_db_connection()
+    if not conn:
+        sys.exit(1)
+    try:
+        failures = check_queries(conn)
+    finally:
+        conn.close()
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,2 @@
+def letter_grade(score):
+    return 'A' if score >= 90 else 'B' if score >= 70 else 'C' if score >= 50 else 'D' if score >= 30 else 'F'
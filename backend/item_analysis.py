@@ -0,0 +1,170 @@
+"""Per-question item analysis for a subject.
+
+For every question: how often it is answered correctly, how the answers
+are spread over the options, how well it discriminates between strong
+and weak attempts (point-biserial correlation between answering it
+correctly and the attempt's score) and a difficulty suggested by its
+correct rate.
+
+All of these are derived from a few additive per-question sums, held in
+NumPy arrays per subject. A request only reads the QuestionAttempt rows
+of attempts newer than the last AttemptID already folded in. The sums are
+rebuilt from scratch when the subject's questions change in this process
+or after ITEM_ANALYSIS_MAX_AGE seconds, which also picks up deleted
+students, edits made by other workers and attempts that committed out of
+AttemptID order. Attempts moved to QuizAttemptArchive (archive.py) are
+not included, so the analysis covers the last ARCHIVE_AFTER_DAYS.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from question_bank import question_bank
+
+ITEM_ANALYSIS_MAX_AGE = float(os.getenv('ITEM_ANALYSIS_MAX_AGE', 3600))
+# Fewer responses than this and no difficulty is suggested
+ITEM_ANALYSIS_MIN_RESPONSES = int(os.getenv('ITEM_ANALYSIS_MIN_RESPONSES', 20))
+
+OPTIONS = ("A", "B", "C", "D")
+# Column of unanswered (or unrecognised) answers in the option counts
+SKIPPED = len(OPTIONS)
+EASY_ABOVE = 0.7
+HARD_BELOW = 0.4
+FETCH_SIZE = 10000
+
+# FIELD() maps the answer to 1-4 (0 for NULL), so every column is an integer
+# and a fetched chunk converts straight into one int64 array.
+ATTEMPT_ROWS_QUERY = """
+    SELECT qa.AttemptID, qa.QuestionID, FIELD(qa.StudentAnswer, 'A', 'B', 'C', 'D'), a.Score
+    FROM QuizAttempt a
+    JOIN QuestionAttempt qa ON qa.AttemptID = a.AttemptID
+    WHERE a.SubjectID = %s AND a.AttemptID > %s
+"""
+
+
+class SubjectItemStats:
+    """Running sums over every answer given to one subject's questions."""
+
+    def __init__(self, bank, generation):
+        self.bank = bank
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.watermark = 0
+        records = sorted(bank.records, key=lambda record: record.id)
+        self.records = records
+        self.question_ids = np.array([record.id for record in records], dtype=np.int64)
+        self.key = np.array([OPTIONS.index(record.correct_option) if record.correct_option in OPTIONS else -1
+                             for record in records], dtype=np.int64)
+        size = len(records)
+        self.responses = np.zeros(size, dtype=np.int64)
+        self.option_counts = np.zeros((size, SKIPPED + 1), dtype=np.int64)
+        # x = answered correctly (0/1), y = the attempt's score
+        self.sum_x = np.zeros(size)
+        self.sum_y = np.zeros(size)
+        self.sum_y2 = np.zeros(size)
+        self.sum_xy = np.zeros(size)
+
+    def refresh(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(ATTEMPT_ROWS_QUERY, (self.bank.subject_id, self.watermark))
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                self.add(np.array(rows, dtype=np.int64))
+        finally:
+            cursor.close()
+
+    def add(self, rows):
+        """Fold an (n, 4) array of AttemptID, QuestionID, FIELD(answer), Score rows in."""
+        size = len(self.question_ids)
+        self.watermark = max(self.watermark, int(rows[:, 0].max()))
+        if not size:
+            return
+        # Rows for questions no longer in the bank are ignored
+        pos = np.searchsorted(self.question_ids, rows[:, 1])
+        known = self.question_ids[np.minimum(pos, size - 1)] == rows[:, 1]
+        pos = pos[known]
+        answers = np.where(rows[known, 2] > 0, rows[known, 2] - 1, SKIPPED)
+        x = (answers == self.key[pos]).astype(np.float64)
+        y = rows[known, 3].astype(np.float64)
+
+        self.responses += np.bincount(pos, minlength=size)
+        self.option_counts += np.bincount(pos * (SKIPPED + 1) + answers,
+                                          minlength=size * (SKIPPED + 1)).reshape(size, SKIPPED + 1)
+        self.sum_x += np.bincount(pos, weights=x, minlength=size)
+        self.sum_y += np.bincount(pos, weights=y, minlength=size)
+        self.sum_y2 += np.bincount(pos, weights=y * y, minlength=size)
+        self.sum_xy += np.bincount(pos, weights=x * y, minlength=size)
+
+    def report(self):
+        n = self.responses.astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = self.sum_x / n
+            mean_y = self.sum_y / n
+            var_y = self.sum_y2 / n - mean_y ** 2
+            cov = self.sum_xy / n - p * mean_y
+            discrimination = cov / np.sqrt(p * (1 - p) * var_y)
+        suggested = np.select([p >= EASY_ABOVE, p < HARD_BELOW], ["Easy", "Hard"], "Medium")
+        enough = self.responses >= ITEM_ANALYSIS_MIN_RESPONSES
+
+        items = []
+        for i, record in enumerate(self.records):
+            counts = self.option_counts[i]
+            items.append({
+                "question_id": record.id,
+                "text": record.text,
+                "difficulty": record.difficulty,
+                "responses": int(self.responses[i]),
+                "correct_rate": round(float(p[i]), 4) if self.responses[i] else None,
+                "option_distribution": {**dict(zip(OPTIONS, counts[:SKIPPED].tolist())), "skipped": int(counts[SKIPPED])},
+                "discrimination": round(float(discrimination[i]), 4) if np.isfinite(discrimination[i]) else None,
+                "suggested_difficulty": str(suggested[i]) if enough[i] else None,
+            })
+        return items
+
+
+class ItemAnalysisCache:
+    def __init__(self, max_age=3600.0):
+        self.max_age = max_age
+        self._subjects = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.refreshes = 0
+
+    def analyze(self, subject_id, conn):
+        """Bring the subject's sums up to date and return (watermark, per-question items)."""
+        with self._lock:
+            subject_lock = self._locks.setdefault(subject_id, threading.Lock())
+        # One refresh per subject at a time; others wait and reuse its result
+        with subject_lock:
+            generation = question_bank.generation(subject_id)
+            stats = self._subjects.get(subject_id)
+            if (stats is None or stats.generation != generation
+                    or time.monotonic() - stats.built_at > self.max_age):
+                stats = SubjectItemStats(question_bank.get(subject_id, conn), generation)
+                self.rebuilds += 1
+            try:
+                stats.refresh(conn)
+            except Exception:
+                # Rows are read unordered, so a partial refresh leaves gaps below the watermark
+                self._subjects.pop(subject_id, None)
+                raise
+            self.refreshes += 1
+            self._subjects[subject_id] = stats
+            return stats.watermark, stats.report()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subjects": len(self._subjects),
+                "rebuilds": self.rebuilds,
+                "refreshes": self.refreshes,
+            }
+
+
+item_analysis = ItemAnalysisCache(max_age=ITEM_ANALYSIS_MAX_AGE)
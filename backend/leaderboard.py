@@ -0,0 +1,262 @@
+"""In-memory per-subject leaderboards.
+
+Each subject keeps every student's best score (ties broken by whoever
+reached it first) in per-score buckets ordered by time, plus a sorted
+top-LEADERBOARD_SIZE list maintained with bisect. The buckets are
+SortedLists, so a student moving between them costs O(log n) however
+many students share a score. A student's rank is the number of students
+in higher buckets plus their position in their own bucket, so it never
+needs a scan of QuizAttempt. Attempts without a timestamp rank after
+every attempt with the same score that has one.
+
+submit_quiz writes the attempt with the time it records here, so the
+times read back from QuizAttempt on a rebuild are the same values.
+
+The boards are warmed with one grouped query at startup. After that,
+submit_quiz records each attempt directly, and reads catch up on
+attempts written by other workers (or flushed from the write-behind
+journal) by reading QuizAttempt rows past the last AttemptID seen, at
+most every LEADERBOARD_SYNC_INTERVAL seconds. Every
+LEADERBOARD_MAX_AGE seconds the boards are rebuilt from scratch.
+"""
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from sortedcontainers import SortedList
+
+from database_async import db
+
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 100))
+LEADERBOARD_SYNC_INTERVAL = float(os.getenv('LEADERBOARD_SYNC_INTERVAL', 5))
+LEADERBOARD_MAX_AGE = float(os.getenv('LEADERBOARD_MAX_AGE', 3600))
+MAX_SCORE = 100
+
+# Best score per student and subject, with the first time it was reached,
+# over live and archived attempts
+BEST_SCORES_QUERY = """
+    SELECT qa.SubjectID, qa.StudentID, qa.Score, MIN(qa.AttemptTimestamp)
+    FROM (SELECT SubjectID, StudentID, Score, AttemptTimestamp FROM QuizAttempt
+          UNION ALL
+          SELECT SubjectID, StudentID, Score, AttemptTimestamp FROM QuizAttemptArchive) qa
+    JOIN StudentSubjectSummary ss
+      ON ss.StudentID = qa.StudentID AND ss.SubjectID = qa.SubjectID AND ss.BestScore = qa.Score
+    GROUP BY qa.SubjectID, qa.StudentID, qa.Score
+"""
+NEW_ATTEMPTS_QUERY = """
+    SELECT AttemptID, SubjectID, StudentID, Score, AttemptTimestamp
+    FROM QuizAttempt WHERE AttemptID > %s
+"""
+
+
+def _when(reached_at):
+    # Orders unknown times (NULL AttemptTimestamp) after all known ones
+    return (reached_at is None, reached_at or datetime.min)
+
+
+class SubjectLeaderboard:
+    def __init__(self, size):
+        self.size = size
+        # (score, reached_at) per student, reached_at as read (may be None)
+        self.best = {}
+        # One SortedList of (_when(reached_at), student_id) per score, oldest first
+        self.buckets = [SortedList() for _ in range(MAX_SCORE + 1)]
+        # Sorted (-score, _when(reached_at), student_id) keys of the leaders
+        self.top = []
+
+    def __len__(self):
+        return len(self.best)
+
+    def record(self, student_id, score, reached_at):
+        """Apply one attempt; returns True if it changed the student's standing."""
+        score = max(0, min(MAX_SCORE, score))
+        when = _when(reached_at)
+        old = self.best.get(student_id)
+        # Keep the old entry if it is a higher score, or the same score reached no later
+        if old is not None and (-old[0], _when(old[1])) <= (-score, when):
+            return False
+        if old is not None:
+            self._unlink(student_id, *old)
+        self.best[student_id] = (score, reached_at)
+        self.buckets[score].add((when, student_id))
+        key = (-score, when, student_id)
+        # The top list is at most `size` long, so insort stays cheap
+        if len(self.top) < self.size or key < self.top[-1]:
+            insort(self.top, key)
+            if len(self.top) > self.size:
+                self.top.pop()
+        return True
+
+    def remove(self, student_id):
+        old = self.best.pop(student_id, None)
+        if old is None:
+            return
+        if self._unlink(student_id, *old):
+            self._refill_top()
+
+    def _unlink(self, student_id, score, reached_at):
+        when = _when(reached_at)
+        self.buckets[score].remove((when, student_id))
+        key = (-score, when, student_id)
+        i = bisect_left(self.top, key)
+        if i < len(self.top) and self.top[i] == key:
+            del self.top[i]
+            return True
+        return False
+
+    def _refill_top(self):
+        top = []
+        for score in range(MAX_SCORE, -1, -1):
+            for when, student_id in self.buckets[score]:
+                if len(top) == self.size:
+                    self.top = top
+                    return
+                top.append((-score, when, student_id))
+        self.top = top
+
+    def rank(self, student_id):
+        entry = self.best.get(student_id)
+        if entry is None:
+            return None
+        score, reached_at = entry
+        ahead = sum(len(bucket) for bucket in self.buckets[score + 1:])
+        return ahead + self.buckets[score].bisect_left((_when(reached_at), student_id)) + 1
+
+    def leaders(self, limit):
+        return [(rank, student_id, -neg_score, self.best[student_id][1])
+                for rank, (neg_score, _, student_id) in enumerate(self.top[:limit], start=1)]
+
+
+class LeaderboardStore:
+    def __init__(self, size=100, sync_interval=5.0, max_age=3600.0):
+        self.size = size
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self._boards = {}
+        self._watermark = 0
+        self._synced_at = None
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._sync_lock = None
+        self.rebuilds = 0
+        self.syncs = 0
+
+    def _board(self, subject_id):
+        board = self._boards.get(subject_id)
+        if board is None:
+            board = self._boards[subject_id] = SubjectLeaderboard(self.size)
+        return board
+
+    def record(self, subject_id, student_id, score, reached_at):
+        with self._lock:
+            self._board(subject_id).record(student_id, score, reached_at)
+
+    def remove_student(self, student_id):
+        with self._lock:
+            for board in self._boards.values():
+                board.remove(student_id)
+
+    def invalidate(self):
+        """Rebuild on the next refresh, e.g. after another worker deleted a student."""
+        with self._lock:
+            self._built_at = None
+            self._synced_at = None
+
+    async def refresh(self, force=False):
+        """Rebuild or catch up with QuizAttempt if the boards are due for it."""
+        now = time.monotonic()
+        if not force and self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        async with self._sync_lock:
+            now = time.monotonic()
+            if not force and self._synced_at is not None and now - self._synced_at < self.sync_interval:
+                return
+            if force or self._built_at is None or now - self._built_at > self.max_age:
+                await self._rebuild()
+            else:
+                await self._catch_up()
+            self._synced_at = time.monotonic()
+
+    async def _rebuild(self):
+        # Read the watermark first: attempts committed meanwhile are applied
+        # again by the next catch-up, which is harmless
+        row = await db.fetchone("SELECT COALESCE(MAX(AttemptID), 0) FROM QuizAttempt")
+        rows = await db.fetchall(BEST_SCORES_QUERY)
+        boards = {}
+        for subject_id, student_id, score, reached_at in rows:
+            board = boards.get(subject_id)
+            if board is None:
+                board = boards[subject_id] = SubjectLeaderboard(self.size)
+            board.record(student_id, score, reached_at)
+        with self._lock:
+            self._boards = boards
+            self._watermark = row[0]
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+
+    async def _catch_up(self):
+        rows = await db.fetchall(NEW_ATTEMPTS_QUERY, (self._watermark,))
+        with self._lock:
+            for attempt_id, subject_id, student_id, score, reached_at in rows:
+                self._board(subject_id).record(student_id, score, reached_at)
+                self._watermark = max(self._watermark, attempt_id)
+            self.syncs += 1
+
+    def standings(self, subject_id, limit, student_id=None):
+        """(number of ranked students, leaders, (rank, score, reached_at) of student_id or None)."""
+        with self._lock:
+            board = self._boards.get(subject_id)
+            if board is None:
+                return 0, [], None
+            you = None
+            if student_id is not None and student_id in board.best:
+                score, reached_at = board.best[student_id]
+                you = (board.rank(student_id), score, reached_at)
+            return len(board), board.leaders(limit), you
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subjects": len(self._boards),
+                "students": sum(len(board) for board in self._boards.values()),
+                "last_attempt_id": self._watermark,
+                "rebuilds": self.rebuilds,
+                "syncs": self.syncs,
+            }
+
+
+leaderboards = LeaderboardStore(LEADERBOARD_SIZE, LEADERBOARD_SYNC_INTERVAL, LEADERBOARD_MAX_AGE)
+
+
+async def leaderboard_view(subject_id, limit, student_id=None):
+    await leaderboards.refresh()
+    total, leaders, you = leaderboards.standings(subject_id, limit, student_id)
+    names = {}
+    ids = [leader[1] for leader in leaders] + ([student_id] if you else [])
+    if ids:
+        rows = await db.fetchall(f"SELECT StudentID, SName FROM Student WHERE StudentID IN ({', '.join(['%s'] * len(ids))})",
+                                 tuple(ids))
+        names = dict(rows)
+    return {
+        "subject_id": subject_id,
+        "students": total,
+        "top": [{
+            "rank": rank,
+            "student_id": sid,
+            "student_name": names.get(sid, ""),
+            "best_score": score,
+            "reached_at": reached_at.strftime("%Y-%m-%d %H:%M:%S") if reached_at else None
+        } for rank, sid, score, reached_at in leaders],
+        "you": {
+            "rank": you[0],
+            "student_id": student_id,
+            "student_name": names.get(student_id, ""),
+            "best_score": you[1],
+            "reached_at": you[2].strftime("%Y-%m-%d %H:%M:%S") if you[2] else None
+        } if you else None
+    }
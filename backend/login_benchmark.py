@@ -0,0 +1,76 @@
+"""Login throughput of the password hash pool, without a database.
+
+Measures how many scrypt verifications one core does per second, then
+drives login_pool-style PasswordHashPools of increasing size with a burst
+of concurrent logins (as at the start of an exam) and reports logins/sec,
+logins/sec per worker, latency and how many logins were turned away
+with 429 because the pending limit was reached.
+
+    python login_benchmark.py --logins 200 --workers 1,2,4 --max-pending 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from passwords import (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_P, PASSWORD_SCRYPT_R, HashPoolSaturated,
+                       PasswordHashPool, hash_password, verify_password)
+
+
+def serial_rate(stored, seconds=2.0):
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        verify_password("Student@123", stored)
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+async def burst(pool, stored, logins):
+    latencies = []
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            await pool.verify("Student@123", stored)
+        except HashPoolSaturated:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return time.perf_counter() - started, latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="concurrent logins per burst")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})),
+                        help="comma-separated pool sizes to try")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="pending limit of each pool (default: no limit, every login is served)")
+    args = parser.parse_args()
+
+    stored = hash_password("Student@123")
+    print(f"scrypt n={PASSWORD_SCRYPT_N} r={PASSWORD_SCRYPT_R} p={PASSWORD_SCRYPT_P}, {os.cpu_count()} CPUs")
+    rate = serial_rate(stored)
+    print(f"one thread: {rate:.1f} logins/s ({1000 / rate:.1f} ms per verification)\n")
+
+    print(f"{'workers':>8}{'served':>8}{'429':>6}{'logins/s':>10}{'per worker':>12}{'p50 ms':>9}{'p99 ms':>9}")
+    for workers in (int(n) for n in args.workers.split(",")):
+        pool = PasswordHashPool(workers, args.max_pending or args.logins)
+        elapsed, latencies, rejected = asyncio.run(burst(pool, stored, args.logins))
+        pool.shutdown()
+        served = len(latencies)
+        throughput = served / elapsed
+        p50 = 1000 * statistics.median(latencies) if latencies else 0.0
+        p99 = 1000 * sorted(latencies)[int(0.99 * (served - 1))] if latencies else 0.0
+        print(f"{workers:>8}{served:>8}{rejected:>6}{throughput:>10.1f}{throughput / workers:>12.1f}{p50:>9.0f}{p99:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
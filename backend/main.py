@@ -1,7 +1,58 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
-app = FastAPI()
+from database import db_connection, replicas
+from database_async import db, DatabaseUnavailable
+from migrate import apply_migrations
+from attempt_journal import attempt_journal, journal_stats
+from pagination import PAGE_HEADERS
+from quiz_sessions import quiz_sessions, SESSION_HEADER
+import metrics
+from slow_queries import slow_query_log, SlowQueryMiddleware
+from leaderboard import leaderboards
+from quiz_generator import seen_questions
+from payloads import payload_cache
+from compression import CompressionMiddleware
+from passwords import login_pool, shutdown_bulk_pool
+from tokens import authorize_instructor, authorize_student, require_admin, token_signer
+from cache_bus import cache_bus
+from etags import resource_versions
+
+@asynccontextmanager
+async def lifespan(app):
+    if os.getenv('DB_AUTO_MIGRATE') == '1':
+        await run_in_threadpool(run_migrations)
+    if slow_query_log is not None:
+        slow_query_log.start()
+    if attempt_journal is not None:
+        await run_in_threadpool(attempt_journal.start)
+    await run_in_threadpool(replicas.start)
+    await run_in_threadpool(cache_bus.start)
+    try:
+        await leaderboards.refresh()
+    except Exception as e:
+        # Not fatal: the first leaderboard request tries again
+        print(f"Failed to warm leaderboards: {e}")
+    yield
+    await run_in_threadpool(cache_bus.stop)
+    await run_in_threadpool(replicas.stop)
+    if attempt_journal is not None:
+        await run_in_threadpool(attempt_journal.stop)
+    if slow_query_log is not None:
+        await run_in_threadpool(slow_query_log.stop)
+    await db.close()
+    login_pool.shutdown()
+    shutdown_bulk_pool()
+
+def run_migrations():
+    with db_connection() as conn:
+        apply_migrations(conn)
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -15,15 +66,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=PAGE_HEADERS + [SESSION_HEADER],
 )
 
-from routers import auth, student, instructor, admin
+app.add_middleware(CompressionMiddleware)
+if slow_query_log is not None:
+    app.add_middleware(SlowQueryMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+from routers import auth, student, instructor, admin, export
+from database import get_pool_stats
+from question_bank import question_bank
+from item_analysis import item_analysis
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
-app.include_router(student.router, prefix="/api/student", tags=["student"])
-app.include_router(instructor.router, prefix="/api/instructor", tags=["instructor"])
-app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+# Identity and scope come from the bearer token issued at login
+app.include_router(student.router, prefix="/api/student", tags=["student"], dependencies=[Depends(authorize_student)])
+app.include_router(instructor.router, prefix="/api/instructor", tags=["instructor"], dependencies=[Depends(authorize_instructor)])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+app.include_router(export.router, prefix="/api/export", tags=["export"])
+
+def questions_changed(subject_id):
+    question_bank.invalidate(int(subject_id))
+    resource_versions.bump("questions", int(subject_id))
+
+def subjects_changed(_):
+    payload_cache.invalidate("subjects")
+    resource_versions.bump("subjects")
+
+# Writes on any worker evict the matching cache entries on every worker
+cache_bus.subscribe("questions", questions_changed)
+cache_bus.subscribe("subjects", subjects_changed)
+cache_bus.subscribe("instructors", lambda _: resource_versions.bump("instructors"))
+cache_bus.subscribe("students", lambda _: leaderboards.invalidate())
+
+metrics.registry.add_gauges("quiz_db_pool", get_pool_stats)
+metrics.registry.add_gauges("quiz_db_reads", replicas.stats)
+metrics.registry.add_gauges("quiz_question_bank", question_bank.stats)
+metrics.registry.add_gauges("quiz_sessions", quiz_sessions.stats)
+metrics.registry.add_gauges("quiz_attempt_journal", journal_stats)
+metrics.registry.add_gauges("quiz_seen_questions", seen_questions.stats)
+metrics.registry.add_gauges("quiz_login_pool", login_pool.stats)
+metrics.registry.add_gauges("quiz_tokens", token_signer.stats)
+metrics.registry.add_gauges("quiz_cache_bus", cache_bus.stats)
+if slow_query_log is not None:
+    metrics.registry.add_gauges("quiz_slow_queries", slow_query_log.stats)
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    return JSONResponse(status_code=500, content={"detail": "Database connection failed"})
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Quiz System API"}
+
+@app.get("/api/health/db")
+def db_pool_stats():
+    return {"backend": db.name, "pool": get_pool_stats(), "reads": replicas.stats()}
+
+@app.get("/api/health/cache")
+def cache_stats():
+    return {"question_bank": question_bank.stats(), "quiz_sessions": quiz_sessions.stats(),
+            "item_analysis": item_analysis.stats(), "leaderboards": leaderboards.stats(),
+            "seen_questions": seen_questions.stats(), "payloads": payload_cache.stats(),
+            "tokens": token_signer.stats(), "cache_bus": cache_bus.stats()}
+
+@app.get("/api/health/logins")
+def login_pool_stats():
+    return login_pool.stats()
+
+@app.get("/api/health/attempts")
+def attempt_write_stats():
+    return journal_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,242 @@
+"""In-process metrics, exported in Prometheus text format at /metrics.
+
+Records per-route request latency, per-query timings (via the cursors
+handed out by database.py and database_async.py), connection checkout
+time and error counts. Set METRICS_ENABLED=0 to turn recording off; the
+middleware is then not installed and cursors are only wrapped if a query
+observer such as the slow-query log is registered.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Callables run as observer(sql, params, seconds, many) after every timed
+# statement, e.g. the slow-query log
+query_observers = []
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.I)
+
+
+def query_label(sql):
+    """Short, low-cardinality label for a statement, e.g. 'SELECT Question'."""
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ''
+    match = _TABLE.search(sql)
+    return f"{operation} {match.group(1)}" if match else operation
+
+
+def instrument_queries():
+    return METRICS_ENABLED or bool(query_observers)
+
+
+def route_name(scope):
+    """Handler a request was routed to, e.g. 'student.get_quiz'."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    return f"{endpoint.__module__.rsplit('.', 1)[-1]}.{endpoint.__name__}"
+
+
+def _observe_query(sql, params, elapsed, many, failed):
+    if METRICS_ENABLED:
+        label = query_label(sql)
+        db_query_duration.observe(elapsed, label)
+        if failed:
+            db_query_errors.inc(label)
+    for observer in query_observers:
+        observer(sql, params, elapsed, many)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    labels = _format_labels(self.labels + ('le',), label_values + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Callables returning {name: value} that are sampled at scrape time
+        self.gauge_sources = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_gauges(self, prefix, source):
+        self.gauge_sources.append((prefix, source))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, source in self.gauge_sources:
+            for key, value in source().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "quiz_http_request_duration_seconds", "HTTP request latency by route", ("route", "method", "status"))
+db_query_duration = registry.histogram(
+    "quiz_db_query_duration_seconds", "Database statement latency", ("query",))
+db_query_errors = registry.counter(
+    "quiz_db_query_errors_total", "Database statements that raised", ("query",))
+db_checkout_duration = registry.histogram(
+    "quiz_db_connection_checkout_seconds", "Time to check a connection out of the pool", ("backend",))
+db_checkout_errors = registry.counter(
+    "quiz_db_connection_checkout_errors_total", "Failed connection checkouts", ("backend",))
+
+
+class InstrumentedCursor:
+    """Wraps a mysql.connector cursor and times every statement."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, sql, params, many):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = method(sql, params)
+            failed = False
+            return result
+        finally:
+            _observe_query(sql, params, time.perf_counter() - started, many, failed)
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        return self._timed(lambda s, p: self._cursor.execute(s, p, *args, **kwargs), sql, params, False)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        return self._timed(lambda s, p: self._cursor.executemany(s, p, *args, **kwargs), sql, seq_params, True)
+
+
+class InstrumentedAsyncCursor:
+    """Same as InstrumentedCursor, for aiomysql's awaitable cursors."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _timed(self, method, sql, params, many):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await method(sql, params)
+            failed = False
+            return result
+        finally:
+            _observe_query(sql, params, time.perf_counter() - started, many, failed)
+
+    async def execute(self, sql, params=None):
+        return await self._timed(self._cursor.execute, sql, params, False)
+
+    async def executemany(self, sql, seq_params):
+        return await self._timed(self._cursor.executemany, sql, seq_params, True)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by handler rather than raw path to keep cardinality bounded
+            http_request_duration.observe(time.perf_counter() - started, route_name(scope), scope["method"], status[0])
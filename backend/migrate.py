@@ -0,0 +1,111 @@
+"""Versioned schema migrations.
+
+Migrations are the numbered .sql files in migrations/ (0001_name.sql,
+0002_name.sql, ...). Each is applied once, in order, and recorded in the
+SchemaMigration table. Run them from the backend directory with:
+
+    python migrate.py          # apply pending migrations
+    python migrate.py status   # list applied and pending migrations
+
+or set DB_AUTO_MIGRATE=1 to apply pending migrations when the API starts.
+"""
+import os
+import re
+import sys
+
+from database import get_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+# Serialises runners when several API workers start at the same time
+LOCK_NAME = 'quizsystem_migrations'
+LOCK_TIMEOUT = 120
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SchemaMigration (
+            Version INT PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            AppliedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_table(cursor)
+    cursor.execute("SELECT Version FROM SchemaMigration")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(conn, log=print):
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("Could not acquire the migration lock")
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, path in discover_migrations():
+            if version in done:
+                continue
+            log(f"Applying migration {version:04d}_{name}")
+            with open(path, encoding='utf-8') as f:
+                statements = split_statements(f.read())
+            # MySQL commits DDL implicitly, so a migration is recorded only
+            # after all of its statements have succeeded.
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO SchemaMigration (Version, Name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchone()
+        cursor.close()
+    return applied
+
+
+def migration_status(conn):
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return [(version, name, version in done) for version, name, _ in discover_migrations()]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if command not in ("up", "status"):
+        print("usage: python migrate.py [up|status]")
+        sys.exit(2)
+    conn = get_db_connection()
+    if not conn:
+        sys.exit(1)
+    try:
+        if command == "status":
+            for version, name, is_applied in migration_status(conn):
+                print(f"{'applied' if is_applied else 'pending':8} {version:04d}_{name}")
+        else:
+            applied = apply_migrations(conn)
+            print(f"Applied {len(applied)} migration(s)")
+    finally:
+        conn.close()
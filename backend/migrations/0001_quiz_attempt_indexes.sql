@@ -0,0 +1,5 @@
+-- get_results: WHERE StudentID = ? ORDER BY AttemptTimestamp DESC.
+-- SubjectID and Score are included so the attempt rows never have to be read.
+CREATE INDEX idx_quizattempt_student_time ON QuizAttempt (StudentID, AttemptTimestamp, SubjectID, Score);
+-- get_students (DISTINCT StudentID) and the grade endpoints: WHERE SubjectID = ?
+CREATE INDEX idx_quizattempt_subject_student ON QuizAttempt (SubjectID, StudentID, Score);
@@ -0,0 +1,2 @@
+-- Question bank loads and get_questions: WHERE SubjectID = ? [AND Difficulty = ?] ORDER BY QuestionID
+CREATE INDEX idx_question_subject_difficulty ON Question (SubjectID, Difficulty);
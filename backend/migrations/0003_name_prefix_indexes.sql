@@ -0,0 +1,5 @@
+-- name_prefix filters on the admin lists: WHERE SName/IName LIKE 'prefix%'.
+-- Logins look rows up by primary key, which already makes the password
+-- comparison a single-row check, so they need no extra index.
+CREATE INDEX idx_student_name ON Student (SName);
+CREATE INDEX idx_instructor_name ON Instructor (IName);
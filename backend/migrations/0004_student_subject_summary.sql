@@ -0,0 +1,14 @@
+-- Databases created before StudentSubjectSummary was added to quizsystem.sql.
+-- Populate it afterwards with: python summaries.py rebuild
+CREATE TABLE IF NOT EXISTS StudentSubjectSummary (
+    StudentID INT NOT NULL,
+    SubjectID INT NOT NULL,
+    Attempts INT NOT NULL DEFAULT 0,
+    BestScore INT NOT NULL DEFAULT 0,
+    ScoreSum INT NOT NULL DEFAULT 0,
+    LastAttempt DATETIME NULL,
+    PRIMARY KEY (StudentID, SubjectID),
+    INDEX (SubjectID, BestScore),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE,
+    FOREIGN KEY (SubjectID) REFERENCES Subject(SubjectID)
+);
@@ -0,0 +1,6 @@
+-- Last journal entry flushed to QuizAttempt by each write-behind journal file
+-- (see attempt_journal.py). Updated in the same transaction as the attempts.
+CREATE TABLE AttemptJournalCheckpoint (
+    JournalName VARCHAR(100) PRIMARY KEY,
+    LastSeq BIGINT NOT NULL
+);
@@ -0,0 +1,3 @@
+-- Item analysis reads new attempts incrementally and the grade list pages
+-- through them: WHERE SubjectID = ? AND AttemptID > ?. Score makes it covering.
+CREATE INDEX idx_quizattempt_subject_attempt ON QuizAttempt (SubjectID, AttemptID, Score);
@@ -0,0 +1,5 @@
+-- Passwords are stored as scrypt hashes ("scrypt$n$r$p$salt$hash", about
+-- 95 characters). Existing plaintext values are rehashed at the next login.
+ALTER TABLE Student MODIFY SPassword VARCHAR(255) NOT NULL;
+ALTER TABLE Instructor MODIFY IPassword VARCHAR(255) NOT NULL;
+ALTER TABLE Admin MODIFY APassword VARCHAR(255) NOT NULL;
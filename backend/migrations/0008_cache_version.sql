@@ -0,0 +1,9 @@
+-- Databases created before CacheVersion was added to quizsystem.sql.
+-- One row per cached resource ("questions:3", "instructors", ...). Write
+-- handlers bump Version in their transaction; every API worker polls the
+-- table and drops its cached copy of whatever moved (cache_bus.py).
+CREATE TABLE IF NOT EXISTS CacheVersion (
+    CacheKey VARCHAR(64) PRIMARY KEY,
+    Version BIGINT NOT NULL,
+    UpdatedAt TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)
+);
@@ -0,0 +1,26 @@
+-- Databases created before these tables were added to quizsystem.sql.
+-- Attempts older than ARCHIVE_AFTER_DAYS, moved out of QuizAttempt and
+-- QuestionAttempt by archive.py. Answers holds the attempt's answers packed
+-- 5 bytes per question (archive.pack_answers). The indexes mirror the ones
+-- on QuizAttempt so the history and grade queries read both the same way.
+CREATE TABLE IF NOT EXISTS QuizAttemptArchive (
+    AttemptID INT PRIMARY KEY,
+    StudentID INT NOT NULL,
+    SubjectID INT NOT NULL,
+    AttemptTimestamp DATETIME NULL,
+    Score INT NOT NULL,
+    Answers BLOB NOT NULL,
+    INDEX idx_archive_student_time (StudentID, AttemptTimestamp, SubjectID, Score),
+    INDEX idx_archive_subject_student (SubjectID, StudentID, Score),
+    INDEX idx_archive_subject_attempt (SubjectID, AttemptID, Score),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE,
+    FOREIGN KEY (SubjectID) REFERENCES Subject(SubjectID)
+);
+-- Questions each student was given in archived attempts, so quiz generation
+-- keeps treating them as seen (quiz_generator.SEEN_QUERY). Filled by archive.py.
+CREATE TABLE IF NOT EXISTS ArchivedSeenQuestion (
+    StudentID INT NOT NULL,
+    QuestionID INT NOT NULL,
+    PRIMARY KEY (StudentID, QuestionID),
+    FOREIGN KEY (StudentID) REFERENCES Student(StudentID) ON DELETE CASCADE
+);
@@ -11,3 +11,4 @@ class LoginResponse(BaseModel):
     name: str
     role: str
     subject_id: Optional[int] = None
+    token: str # Bearer token for the other endpoints
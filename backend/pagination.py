@@ -0,0 +1,92 @@
+from bisect import bisect_right
+
+from fastapi import Query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Headers the frontend needs to read from paginated list responses
+PAGE_HEADERS = ["X-Total-Count", "X-Next-After-Id"]
+
+
+class PageParams:
+    """Keyset pagination query parameters: ?after_id=<last id seen>&limit=<n>."""
+
+    def __init__(self,
+                 after_id: int = Query(None, ge=0),
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+        self.after_id = after_id
+        self.limit = limit
+
+
+def like_prefix(prefix):
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _where(conditions):
+    return (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def count_query(count_sql, conditions=(), params=()):
+    """(sql, params) of the total count fetch_page sends for the first page."""
+    counts = (count_sql,) if isinstance(count_sql, str) else tuple(count_sql)
+    if len(counts) == 1:
+        return counts[0] + _where(conditions), list(params)
+    return ("SELECT " + " + ".join(f"({sql}{_where(conditions)})" for sql in counts),
+            list(params) * len(counts))
+
+
+def page_query(select_sql, key_column, conditions=(), params=(), after_id=None, limit=DEFAULT_PAGE_SIZE):
+    """(sql, params) selecting up to `limit` rows with `key_column` > after_id."""
+    selects = (select_sql,) if isinstance(select_sql, str) else tuple(select_sql)
+    conditions = list(conditions)
+    params = list(params)
+    if after_id is not None:
+        conditions.append(f"{key_column} > %s")
+        params.append(after_id)
+    if len(selects) == 1:
+        return f"{selects[0]}{_where(conditions)} ORDER BY {key_column} LIMIT %s", params + [limit]
+    branches = " UNION ALL ".join(f"({sql}{_where(conditions)} ORDER BY {key_column} LIMIT %s)" for sql in selects)
+    return f"{branches} ORDER BY 1 LIMIT %s", (params + [limit]) * len(selects) + [limit]
+
+
+def fetch_page(cursor, response, page, select_sql, count_sql, key_column, conditions=(), params=()):
+    """Run a keyset-paginated query and set the paging headers on `response`.
+
+    `select_sql` must select `key_column` as its first column. The total
+    count is only computed for the first page (no after_id), where it is
+    an index-only COUNT over the same filters; later pages reuse it.
+
+    `select_sql` and `count_sql` can also be tuples of queries over tables
+    with the same columns, such as live and archived attempts. Each one is
+    filtered and limited on its own and the rows are merged by key.
+    """
+    if page.after_id is None:
+        cursor.execute(*count_query(count_sql, conditions, params))
+        response.headers["X-Total-Count"] = str(cursor.fetchone()[0])
+
+    # One extra row tells us whether there is a next page
+    cursor.execute(*page_query(select_sql, key_column, conditions, params, page.after_id, page.limit + 1))
+    rows = cursor.fetchall()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers["X-Next-After-Id"] = str(rows[-1][0])
+    return rows
+
+
+def page_slice(items, page, key):
+    """In-memory counterpart of fetch_page for a list already sorted by `key`.
+
+    Returns the page and the paging headers to send with it.
+    """
+    headers = {}
+    if page.after_id is None:
+        headers["X-Total-Count"] = str(len(items))
+        start = 0
+    else:
+        start = bisect_right(items, page.after_id, key=key)
+    rows = items[start:start + page.limit]
+    if start + page.limit < len(items):
+        headers["X-Next-After-Id"] = str(key(rows[-1]))
+    return rows, headers
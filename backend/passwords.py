@@ -0,0 +1,162 @@
+"""Password hashing and the bounded pool that verifies logins.
+
+Passwords are stored as "scrypt$n$r$p$salt$hash" (base64 salt and hash),
+using the scrypt in hashlib so no compiled dependency is needed. Values
+that do not start with "scrypt$" are plaintext passwords from before
+hashing: they are compared in constant time and rehashed by the login
+handlers after a successful login. Hashes made with other parameters
+than the current PASSWORD_SCRYPT_N/R/P are rehashed the same way.
+
+A hash takes tens of milliseconds of CPU, so login verification runs on
+its own PASSWORD_HASH_WORKERS threads (hashlib.scrypt releases the GIL)
+instead of the request threadpool. At most PASSWORD_HASH_MAX_PENDING
+hashes may be running or queued; past that login_pool raises
+HashPoolSaturated and the handlers answer 429 with Retry-After.
+
+Bulk imports hash with hash_passwords() on a separate pool of
+PASSWORD_BULK_WORKERS threads, shared by all imports, so an import never
+queues ahead of logins and concurrent imports cannot take every core.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', 2 ** 14))
+PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8 * PASSWORD_HASH_WORKERS))
+PASSWORD_RETRY_AFTER = int(os.getenv('PASSWORD_RETRY_AFTER', 1))
+# Half the cores by default, leaving the rest for logins
+PASSWORD_BULK_WORKERS = int(os.getenv('PASSWORD_BULK_WORKERS', max(1, PASSWORD_HASH_WORKERS // 2)))
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password, salt, n, r, p):
+    # scrypt needs about 128 * r * (n + p) bytes; leave headroom over that
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * (n + p) + 2 ** 20, dklen=HASH_BYTES)
+
+
+def hash_password(password):
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    return f"{SCHEME}${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+_bulk_executor = ThreadPoolExecutor(max_workers=PASSWORD_BULK_WORKERS, thread_name_prefix="password-bulk")
+
+
+async def hash_passwords(passwords):
+    """Hash each password with its own salt on the bulk pool; results keep the input order."""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(_bulk_executor, hash_password, password)
+                                  for password in passwords))
+
+
+def shutdown_bulk_pool():
+    _bulk_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + "$")
+
+
+def _parse(stored):
+    _, n, r, p, salt, digest = stored.split("$")
+    return int(n), int(r), int(p), base64.b64decode(salt), base64.b64decode(digest)
+
+
+def needs_rehash(stored):
+    if not is_hashed(stored):
+        return True
+    n, r, p, _, _ = _parse(stored)
+    return (n, r, p) != (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+
+
+def verify_password(password, stored):
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        n, r, p, salt, digest = _parse(stored)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), digest)
+
+
+class HashPoolSaturated(Exception):
+    pass
+
+
+class PasswordHashPool:
+    """Runs hashes on dedicated threads, with a cap on running plus queued work."""
+
+    def __init__(self, workers=1, max_pending=8):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashPoolSaturated()
+            self.pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def verify(self, password, stored):
+        """(matches, needs_rehash); plaintext values are checked without the pool."""
+        if not is_hashed(stored):
+            return verify_password(password, stored), True
+        matches = await self.run(verify_password, password, stored)
+        return matches, matches and needs_rehash(stored)
+
+    async def hash(self, password):
+        return await self.run(hash_password, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+login_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
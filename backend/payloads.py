@@ -0,0 +1,95 @@
+"""Pre-serialized JSON for the hottest read responses.
+
+Questions are encoded once per cached question bank: each QuestionRecord
+keeps the bytes of its student view (quiz) and its instructor view, and
+list responses are assembled by joining those fragments. Whole responses
+that rarely change, like the subject list, are kept as bytes in
+`payload_cache` until they are invalidated or PAYLOAD_CACHE_TTL expires.
+
+Handlers return these bytes through json_bytes_response(), which skips
+response_model validation and re-encoding; the models stay on the routes
+for the API docs.
+"""
+import os
+import threading
+import time
+
+import orjson
+from fastapi import Response
+
+PAYLOAD_CACHE_TTL = float(os.getenv('PAYLOAD_CACHE_TTL', 300))
+
+
+def json_bytes_response(content, headers=None):
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def json_array(fragments):
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def quiz_question_json(record):
+    """Student view of a question: no correct option."""
+    if record.quiz_json is None:
+        record.quiz_json = orjson.dumps({"id": record.id, "text": record.text, "options": list(record.options)})
+    return record.quiz_json
+
+
+def question_view_json(record):
+    """Instructor view of a question, as in instructor.QuestionView."""
+    if record.view_json is None:
+        record.view_json = orjson.dumps({
+            "id": record.id,
+            "text": record.text,
+            "option_a": record.options[0],
+            "option_b": record.options[1],
+            "option_c": record.options[2],
+            "option_d": record.options[3],
+            "correct_option": record.correct_option,
+            "difficulty": record.difficulty,
+        })
+    return record.view_json
+
+
+class PayloadCache:
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, payload):
+        content = orjson.dumps(payload)
+        with self._lock:
+            self._payloads[key] = (content, time.monotonic())
+        return content
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._payloads.clear()
+            else:
+                self._payloads.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "payloads": len(self._payloads),
+                "bytes": sum(len(entry[0]) for entry in self._payloads.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl,
+            }
+
+
+payload_cache = PayloadCache(ttl=PAYLOAD_CACHE_TTL)
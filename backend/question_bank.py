@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+
+QUESTION_BANK_TTL = float(os.getenv('QUESTION_BANK_TTL', 300))
+
+BANK_QUERY = """
+    SELECT QuestionID, QuestionText, OptionA, OptionB, OptionC, OptionD, CorrectOption, Difficulty
+    FROM Question WHERE SubjectID = %s
+"""
+
+
+class QuestionRecord:
+    __slots__ = ("id", "text", "options", "correct_option", "difficulty", "quiz_json", "view_json")
+
+    def __init__(self, id, text, options, correct_option, difficulty):
+        self.id = id
+        self.text = text
+        self.options = options
+        self.correct_option = correct_option
+        self.difficulty = difficulty
+        # Encoded on first use by payloads.py
+        self.quiz_json = None
+        self.view_json = None
+
+
+class SubjectBank:
+    """All questions of one subject, held in memory."""
+
+    __slots__ = ("subject_id", "records", "by_id", "by_difficulty", "loaded_at")
+
+    def __init__(self, subject_id, rows):
+        self.subject_id = subject_id
+        # Ordered by QuestionID so the instructor list can page through it
+        self.records = tuple(
+            QuestionRecord(row[0], row[1], (row[2], row[3], row[4], row[5]), row[6], row[7])
+            for row in sorted(rows, key=lambda row: row[0])
+        )
+        self.by_id = {record.id: record for record in self.records}
+        self.by_difficulty = {}
+        for record in self.records:
+            self.by_difficulty.setdefault(record.difficulty, []).append(record)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.records)
+
+    def sample(self, k):
+        return random.sample(self.records, k)
+
+    def answer_key(self):
+        return {record.id: record.correct_option for record in self.records}
+
+
+class QuestionBankCache:
+    """Process-local cache of question banks keyed by SubjectID.
+
+    Entries are dropped when a question of the subject is written, by this
+    or another worker (see cache_bus.py), and otherwise expire after `ttl`
+    seconds.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._banks = {}
+        # Bumped on every invalidation so a load that raced with a write
+        # does not put stale rows back into the cache.
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, subject_id):
+        with self._lock:
+            return (self._epoch, self._generations.get(subject_id, 0))
+
+    def lookup(self, subject_id):
+        with self._lock:
+            bank = self._banks.get(subject_id)
+            if bank is not None and time.monotonic() - bank.loaded_at > self.ttl:
+                del self._banks[subject_id]
+                bank = None
+            if bank is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return bank
+
+    def peek(self, subject_id):
+        """Like lookup(), but without expiring entries or touching the counters."""
+        with self._lock:
+            return self._banks.get(subject_id)
+
+    def store(self, subject_id, rows, generation):
+        bank = SubjectBank(subject_id, rows)
+        with self._lock:
+            if (self._epoch, self._generations.get(subject_id, 0)) == generation:
+                self._banks[subject_id] = bank
+        return bank
+
+    def load(self, subject_id, conn):
+        generation = self.generation(subject_id)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(BANK_QUERY, (subject_id,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return self.store(subject_id, rows, generation)
+
+    def get(self, subject_id, conn):
+        bank = self.lookup(subject_id)
+        if bank is None:
+            bank = self.load(subject_id, conn)
+        return bank
+
+    def invalidate(self, subject_id=None):
+        with self._lock:
+            self.invalidations += 1
+            if subject_id is None:
+                self._epoch += 1
+                self._banks.clear()
+            else:
+                self._generations[subject_id] = self._generations.get(subject_id, 0) + 1
+                self._banks.pop(subject_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subjects": len(self._banks),
+                "questions": sum(len(bank) for bank in self._banks.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl,
+            }
+
+
+question_bank = QuestionBankCache(ttl=QUESTION_BANK_TTL)
@@ -0,0 +1,158 @@
+"""Quiz generation by difficulty blueprint, avoiding repeats.
+
+A quiz takes QUIZ_BLUEPRINT questions from each difficulty of the
+subject's cached question bank, e.g. "Easy:2,Medium:2,Hard:1". Questions
+the student has already been given are skipped while unseen ones remain.
+When a difficulty runs short, the gap is filled from the other
+difficulties, again preferring unseen questions.
+
+Seen questions are kept per student as a frozenset of QuestionIDs, so
+its size follows the student's history rather than the largest ID in
+the database. It is loaded once with SEEN_QUERY and updated by
+submit_quiz. Entries are reloaded after QUIZ_SEEN_TTL seconds so that
+quizzes taken on other workers are picked up.
+
+SEEN_QUERY reads live attempts from QuestionAttempt and archived ones
+from ArchivedSeenQuestion, which archive.py fills as it moves attempts
+out, so archiving does not make old questions count as unseen again.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+QUIZ_BLUEPRINT = os.getenv('QUIZ_BLUEPRINT', 'Easy:2,Medium:2,Hard:1')
+QUIZ_SEEN_TTL = float(os.getenv('QUIZ_SEEN_TTL', 600))
+QUIZ_SEEN_MAX = int(os.getenv('QUIZ_SEEN_MAX', 100000))
+
+# Takes the StudentID twice
+SEEN_QUERY = """
+    SELECT qa.QuestionID
+    FROM QuizAttempt a
+    JOIN QuestionAttempt qa ON qa.AttemptID = a.AttemptID
+    WHERE a.StudentID = %s
+    UNION
+    SELECT QuestionID FROM ArchivedSeenQuestion WHERE StudentID = %s
+"""
+
+
+def parse_blueprint(spec):
+    """'Easy:2,Medium:2,Hard:1' -> {'Easy': 2, 'Medium': 2, 'Hard': 1}"""
+    blueprint = {}
+    for part in spec.split(','):
+        difficulty, _, count = part.partition(':')
+        if not difficulty.strip() or not count.strip().isdigit():
+            raise ValueError(f"Invalid QUIZ_BLUEPRINT entry {part!r}, expected Difficulty:count")
+        blueprint[difficulty.strip()] = int(count)
+    return blueprint
+
+
+BLUEPRINT = parse_blueprint(QUIZ_BLUEPRINT)
+QUIZ_SIZE = sum(BLUEPRINT.values())
+
+
+def _sample_unseen(records, k, seen, exclude):
+    """Up to k random records that are neither seen nor already chosen."""
+    if k <= 0 or not records:
+        return []
+    # Most students have seen a small part of a bank: a few random probes
+    # usually find k unseen questions without walking the whole bucket.
+    picked = {}
+    for _ in range(4 * k):
+        record = random.choice(records)
+        if record.id not in exclude and record.id not in picked and record.id not in seen:
+            picked[record.id] = record
+            if len(picked) == k:
+                return list(picked.values())
+    candidates = [record for record in records
+                  if record.id not in exclude and record.id not in seen]
+    return random.sample(candidates, min(k, len(candidates)))
+
+
+def _sample_any(records, k, exclude):
+    candidates = [record for record in records if record.id not in exclude]
+    return random.sample(candidates, min(k, len(candidates)))
+
+
+def generate_quiz(bank, seen=frozenset(), blueprint=None):
+    """Pick a quiz from a SubjectBank; the caller checks len(bank) >= QUIZ_SIZE."""
+    blueprint = BLUEPRINT if blueprint is None else blueprint
+    chosen = {}
+    shortfall = 0
+    for difficulty, count in blueprint.items():
+        records = bank.by_difficulty.get(difficulty, [])
+        picked = _sample_unseen(records, count, seen, chosen)
+        if len(picked) < count:
+            picked += _sample_any(records, count - len(picked), chosen.keys() | {r.id for r in picked})
+        chosen.update((record.id, record) for record in picked)
+        shortfall += count - len(picked)
+    if shortfall:
+        chosen.update((record.id, record) for record in _sample_unseen(bank.records, shortfall, seen, chosen))
+        shortfall = sum(blueprint.values()) - len(chosen)
+        chosen.update((record.id, record) for record in _sample_any(bank.records, shortfall, chosen))
+    questions = list(chosen.values())
+    random.shuffle(questions)
+    return questions
+
+
+class SeenQuestionStore:
+    """Per-student sets of the questions they have been given."""
+
+    def __init__(self, ttl=600.0, max_students=100000):
+        self.ttl = ttl
+        self.max_students = max_students
+        # student_id -> [question_ids, loaded_at]; loaded_at is None until the
+        # student's history has been read, marks made before that are kept
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, student_id):
+        """The student's seen QuestionIDs, or None if it has to be (re)loaded."""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None or entry[1] is None or time.monotonic() - entry[1] > self.ttl:
+                return None
+            self._entries.move_to_end(student_id)
+            self.hits += 1
+            return entry[0]
+
+    def store(self, student_id, question_ids):
+        seen = frozenset(question_ids)
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                # Keep marks made while the history was being read
+                seen |= entry[0]
+            self._entries[student_id] = [seen, time.monotonic()]
+            self._entries.move_to_end(student_id)
+            self.loads += 1
+            self._evict()
+        return seen
+
+    def mark(self, student_id, question_ids):
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None:
+                entry = self._entries[student_id] = [frozenset(), None]
+            # A new set, so callers holding the old one are not affected
+            entry[0] = entry[0].union(question_ids)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_students:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "students": len(self._entries),
+                "hits": self.hits,
+                "loads": self.loads,
+                "ttl_seconds": self.ttl,
+            }
+
+
+seen_questions = SeenQuestionStore(QUIZ_SEEN_TTL, QUIZ_SEEN_MAX)
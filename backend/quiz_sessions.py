@@ -0,0 +1,110 @@
+"""Server-side quiz sessions.
+
+get_quiz records which questions it handed out, together with their
+answer key, and gives the client an opaque session id. submit_quiz grades
+against that record, so it never has to re-read the Question table and
+cannot be fed answers to questions that were not part of the quiz.
+
+Sessions live in process memory, bounded by a TTL and an LRU cap. Under
+several workers a quiz must be submitted to the worker that issued it
+(use sticky sessions), or the submission is rejected as unknown.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+QUIZ_SESSION_TTL = float(os.getenv('QUIZ_SESSION_TTL', 3600))
+QUIZ_SESSION_MAX = int(os.getenv('QUIZ_SESSION_MAX', 100000))
+
+SESSION_HEADER = "X-Quiz-Session"
+
+
+class QuizSessionError(Exception):
+    pass
+
+
+class QuizSession:
+    __slots__ = ("id", "student_id", "subject_id", "answer_key", "created_at")
+
+    def __init__(self, id, student_id, subject_id, answer_key):
+        self.id = id
+        self.student_id = student_id
+        self.subject_id = subject_id
+        self.answer_key = answer_key
+        self.created_at = time.monotonic()
+
+
+class QuizSessionStore:
+    def __init__(self, ttl=3600.0, max_sessions=100000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        # Ids of recently submitted sessions, so a replay gets a clear error
+        self._consumed = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def create(self, student_id, subject_id, questions):
+        session = QuizSession(secrets.token_urlsafe(16), student_id, subject_id,
+                              {q.id: q.correct_option for q in questions})
+        with self._lock:
+            self._purge_expired()
+            self._sessions[session.id] = session
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return session
+
+    def take(self, session_id):
+        """Remove and return a live session, or raise QuizSessionError."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                self.rejected += 1
+                if session_id in self._consumed:
+                    raise QuizSessionError("Quiz has already been submitted")
+                raise QuizSessionError("Unknown quiz session")
+            if time.monotonic() - session.created_at > self.ttl:
+                self.rejected += 1
+                raise QuizSessionError("Quiz session has expired")
+            self.submitted += 1
+            self._consumed[session_id] = None
+            while len(self._consumed) > self.max_sessions:
+                self._consumed.popitem(last=False)
+            return session
+
+    def restore(self, session):
+        """Put a session back after a submission failed for reasons other than the client's."""
+        with self._lock:
+            self._consumed.pop(session.id, None)
+            self._sessions[session.id] = session
+
+    def _purge_expired(self):
+        # Sessions are kept in creation order, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.created_at >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "created": self.created,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+                "ttl_seconds": self.ttl,
+            }
+
+
+quiz_sessions = QuizSessionStore(ttl=QUIZ_SESSION_TTL, max_sessions=QUIZ_SESSION_MAX)
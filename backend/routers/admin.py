@@ -1,10 +1,29 @@
-from fastapi import APIRouter, HTTPException
-from database import get_db_connection
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Query, Request, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
+from database import get_db_connection, READ
+from pagination import PageParams, fetch_page, like_prefix
+from summaries import GRADE_DISTRIBUTION_SQL, grade_distribution, rebuild_summaries
+from bulk_io import UploadFormatError, chunked, iter_upload_records, validation_message
+from slow_queries import slow_query_log
+from leaderboard import leaderboards
+from etags import Conditional
+from cache_bus import cache_bus
+from passwords import hash_password, hash_passwords
+from database_async import db, DatabaseUnavailable
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Literal, Optional
 
 router = APIRouter()
 
+# Paged by fetch_page
+STUDENTS_QUERY = "SELECT StudentID, SName FROM Student"
+STUDENTS_COUNT_QUERY = "SELECT COUNT(*) FROM Student"
+INSTRUCTORS_QUERY = """
+    SELECT i.InstructorID, i.IName, s.SubjectName
+    FROM Instructor i
+    JOIN Subject s ON i.SubjectID = s.SubjectID"""
+INSTRUCTORS_COUNT_QUERY = "SELECT COUNT(*) FROM Instructor i JOIN Subject s ON i.SubjectID = s.SubjectID"
+
 class StudentCreate(BaseModel):
     id: int
     name: str
@@ -29,14 +48,50 @@ class InstructorView(BaseModel):
     name: str
     subject: str
 
+class RowError(BaseModel):
+    row: int
+    error: str
+
+class BulkReport(BaseModel):
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[RowError]
+
+MAX_REPORTED_ERRORS = 1000
+
+class SlowQuery(BaseModel):
+    sql: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    last_seen: str
+    routes: Dict[str, int]
+    plan: Optional[List[Dict[str, Any]]] = None
+
+class SubjectOverview(BaseModel):
+    subject_id: int
+    subject: str
+    students: int
+    attempts: int
+    average_score: float
+    average_best_score: float
+    grade_distribution: Dict[str, int]
+
 @router.get("/students", response_model=List[StudentView])
-def get_all_students():
-    conn = get_db_connection()
+def get_all_students(response: Response, page: PageParams = Depends(), name_prefix: Optional[str] = None):
+    conn = get_db_connection(READ)
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
-    cursor.execute("SELECT StudentID, SName FROM Student ORDER BY StudentID")
-    students = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
+    conditions, params = [], []
+    if name_prefix:
+        conditions.append("SName LIKE %s")
+        params.append(like_prefix(name_prefix))
+    rows = fetch_page(cursor, response, page, STUDENTS_QUERY, STUDENTS_COUNT_QUERY,
+                      "StudentID", conditions, params)
+    students = [{"id": row[0], "name": row[1]} for row in rows]
     cursor.close()
     conn.close()
     return students
@@ -49,7 +104,7 @@ def add_student(student: StudentCreate):
     cursor = conn.cursor()
     try:
         cursor.execute("INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)", 
-                       (student.id, student.name, student.password))
+                       (student.id, student.name, hash_password(student.password)))
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -68,9 +123,19 @@ def delete_student(student_id: int):
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
     try:
+        # A partitioned QuizAttempt (archive.py) has no foreign keys to cascade along
+        cursor.execute("""
+            DELETE qu FROM QuestionAttempt qu
+            JOIN QuizAttempt qa ON qu.AttemptID = qa.AttemptID
+            WHERE qa.StudentID = %s
+        """, (student_id,))
+        cursor.execute("DELETE FROM QuizAttempt WHERE StudentID = %s", (student_id,))
         cursor.execute("DELETE FROM Student WHERE StudentID = %s", (student_id,))
+        found = cursor.rowcount
+        # Other workers rebuild their leaderboards without the student
+        versions = cache_bus.bump(cursor, "students") if found else {}
         conn.commit()
-        if cursor.rowcount == 0:
+        if found == 0:
             cursor.close()
             conn.close()
             raise HTTPException(status_code=404, detail="Student not found")
@@ -82,6 +147,8 @@ def delete_student(student_id: int):
     
     cursor.close()
     conn.close()
+    leaderboards.remove_student(student_id)
+    cache_bus.publish(versions)
     return {"message": "Student expelled successfully"}
 
 @router.put("/student/password")
@@ -91,7 +158,7 @@ def update_student_password(data: PasswordUpdate):
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE Student SET SPassword = %s WHERE StudentID = %s", (data.new_password, data.id))
+        cursor.execute("UPDATE Student SET SPassword = %s WHERE StudentID = %s", (hash_password(data.new_password), data.id))
         conn.commit()
         if cursor.rowcount == 0:
             cursor.close()
@@ -108,20 +175,24 @@ def update_student_password(data: PasswordUpdate):
     return {"message": "Password updated successfully"}
 
 @router.get("/instructors", response_model=List[InstructorView])
-def get_instructors():
+def get_instructors(request: Request, response: Response, page: PageParams = Depends(), name_prefix: Optional[str] = None):
+    conditional = Conditional(request, "instructors")
+    if conditional.not_modified:
+        return conditional.not_modified_response()
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT i.InstructorID, i.IName, s.SubjectName 
-        FROM Instructor i 
-        JOIN Subject s ON i.SubjectID = s.SubjectID
-        ORDER BY i.InstructorID
-    """)
-    instructors = [{"id": row[0], "name": row[1], "subject": row[2]} for row in cursor.fetchall()]
+    conditions, params = [], []
+    if name_prefix:
+        conditions.append("i.IName LIKE %s")
+        params.append(like_prefix(name_prefix))
+    rows = fetch_page(cursor, response, page, INSTRUCTORS_QUERY, INSTRUCTORS_COUNT_QUERY,
+                      "i.InstructorID", conditions, params)
+    instructors = [{"id": row[0], "name": row[1], "subject": row[2]} for row in rows]
     cursor.close()
     conn.close()
+    response.headers.update(conditional.headers)
     return instructors
 
 @router.post("/instructor/add")
@@ -143,10 +214,11 @@ def add_instructor(instructor: InstructorCreate):
     try:
         if instructor.id:
             cursor.execute("INSERT INTO Instructor (InstructorID, IName, SubjectID, IPassword) VALUES (%s, %s, %s, %s)", 
-                           (instructor.id, instructor.name, subject_id, instructor.password))
+                           (instructor.id, instructor.name, subject_id, hash_password(instructor.password)))
         else:
             cursor.execute("INSERT INTO Instructor (IName, SubjectID, IPassword) VALUES (%s, %s, %s)", 
-                           (instructor.name, subject_id, instructor.password))
+                           (instructor.name, subject_id, hash_password(instructor.password)))
+        versions = cache_bus.bump(cursor, "instructors")
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -156,6 +228,7 @@ def add_instructor(instructor: InstructorCreate):
     
     cursor.close()
     conn.close()
+    cache_bus.publish(versions)
     return {"message": "Instructor added successfully"}
 
 @router.delete("/instructor/delete/{instructor_id}")
@@ -166,8 +239,10 @@ def delete_instructor(instructor_id: int):
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM Instructor WHERE InstructorID = %s", (instructor_id,))
+        found = cursor.rowcount
+        versions = cache_bus.bump(cursor, "instructors") if found else {}
         conn.commit()
-        if cursor.rowcount == 0:
+        if found == 0:
             cursor.close()
             conn.close()
             raise HTTPException(status_code=404, detail="Instructor not found")
@@ -179,6 +254,7 @@ def delete_instructor(instructor_id: int):
     
     cursor.close()
     conn.close()
+    cache_bus.publish(versions)
     return {"message": "Instructor removed successfully"}
 
 @router.put("/instructor/password")
@@ -188,7 +264,7 @@ def update_instructor_password(data: PasswordUpdate):
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE Instructor SET IPassword = %s WHERE InstructorID = %s", (data.new_password, data.id))
+        cursor.execute("UPDATE Instructor SET IPassword = %s WHERE InstructorID = %s", (hash_password(data.new_password), data.id))
         conn.commit()
         if cursor.rowcount == 0:
             cursor.close()
@@ -203,3 +279,172 @@ def update_instructor_password(data: PasswordUpdate):
     cursor.close()
     conn.close()
     return {"message": "Password updated successfully"}
+
+@router.get("/summary", response_model=List[SubjectOverview])
+def get_summary():
+    conn = get_db_connection(READ)
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT s.SubjectID, s.SubjectName, COUNT(ss.StudentID), COALESCE(SUM(ss.Attempts), 0),
+               COALESCE(SUM(ss.ScoreSum), 0), AVG(ss.BestScore), {GRADE_DISTRIBUTION_SQL}
+        FROM Subject s
+        LEFT JOIN StudentSubjectSummary ss ON ss.SubjectID = s.SubjectID
+        GROUP BY s.SubjectID, s.SubjectName
+        ORDER BY s.SubjectID
+    """)
+    overview = []
+    for row in cursor.fetchall():
+        attempts = int(row[3])
+        overview.append({
+            "subject_id": row[0],
+            "subject": row[1],
+            "students": row[2],
+            "attempts": attempts,
+            "average_score": round(int(row[4]) / attempts, 2) if attempts else 0.0,
+            "average_best_score": round(float(row[5] or 0), 2),
+            "grade_distribution": grade_distribution(row[6:])
+        })
+    cursor.close()
+    conn.close()
+    return overview
+
+@router.post("/summary/rebuild")
+def rebuild_summary():
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        rows = rebuild_summaries(conn)
+    except Exception as e:
+        conn.close()
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild summaries: {str(e)}")
+    conn.close()
+    return {"message": f"Rebuilt {rows} summary rows"}
+
+@router.get("/slow-queries", response_model=List[SlowQuery])
+def get_slow_queries(limit: int = Query(20, ge=1, le=500),
+                     order_by: Literal["total_ms", "max_ms", "count"] = "total_ms"):
+    if slow_query_log is None:
+        raise HTTPException(status_code=404, detail="Slow-query log is disabled")
+    return slow_query_log.top(limit, order_by)
+
+def _validated_records(records, model, errors):
+    seen = set()
+    for number, record in records:
+        if isinstance(record, str):
+            errors.append((number, record))
+            continue
+        # Blank CSV cells mean "not given", so model defaults apply
+        record = {key: value for key, value in record.items() if value not in (None, "")}
+        try:
+            item = model(**record)
+        except ValidationError as e:
+            errors.append((number, validation_message(e)))
+            continue
+        if item.id in seen:
+            errors.append((number, f"Duplicate student id {item.id} in upload"))
+            continue
+        seen.add(item.id)
+        yield number, item, record
+
+async def _existing_student_ids(ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    rows = await db.fetchall(f"SELECT StudentID FROM Student WHERE StudentID IN ({placeholders})", ids)
+    return {row[0] for row in rows}
+
+def _bulk_report(inserted, updated, errors):
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "failed": len(errors),
+        "errors": [{"row": row, "error": error} for row, error in errors[:MAX_REPORTED_ERRORS]]
+    }
+
+def _partial_import(message, done):
+    # Chunks are committed as they go, so rows before the failure are kept
+    return f"{message} ({done} rows before this were saved)" if done else message
+
+@router.post("/students/bulk", response_model=BulkReport)
+async def bulk_add_students(file: UploadFile = File(...)):
+    errors = []
+    inserted = updated = 0
+    chunks = chunked(_validated_records(iter_upload_records(file), StudentCreate, errors))
+    try:
+        # One chunk at a time: read it, hash it on the bulk pool with no
+        # transaction open, then write and commit it
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            existing = await _existing_student_ids([item.id for _, item, _ in chunk])
+            # Existing students keep their password unless the row gives one
+            to_hash = [item for _, item, record in chunk if "password" in record or item.id not in existing]
+            hashes = dict(zip((item.id for item in to_hash), await hash_passwords(item.password for item in to_hash)))
+            renamed = [item for _, item, _ in chunk if item.id not in hashes]
+            async with db.transaction() as cursor:
+                if hashes:
+                    with_password = [(item.id, item.name, hashes[item.id]) for _, item, record in chunk
+                                     if "password" in record]
+                    without_password = [(item.id, item.name, hashes[item.id]) for _, item, record in chunk
+                                        if "password" not in record and item.id in hashes]
+                    if with_password:
+                        await cursor.executemany("""
+                            INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE SName = VALUES(SName), SPassword = VALUES(SPassword)
+                        """, with_password)
+                    if without_password:
+                        # A student added since the check keeps their password
+                        await cursor.executemany("""
+                            INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE SName = VALUES(SName)
+                        """, without_password)
+                if renamed:
+                    cases = " ".join(["WHEN %s THEN %s"] * len(renamed))
+                    placeholders = ", ".join(["%s"] * len(renamed))
+                    params = [value for item in renamed for value in (item.id, item.name)]
+                    params += [item.id for item in renamed]
+                    await cursor.execute(f"UPDATE Student SET SName = CASE StudentID {cases} END WHERE StudentID IN ({placeholders})", params)
+            updated += len(existing)
+            inserted += len(chunk) - len(existing)
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=_partial_import(str(e), inserted + updated))
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_partial_import(f"Failed to import students: {str(e)}", inserted + updated))
+
+    return _bulk_report(inserted, updated, errors)
+
+@router.put("/students/passwords/bulk", response_model=BulkReport)
+async def bulk_update_student_passwords(file: UploadFile = File(...)):
+    errors = []
+    updated = 0
+    chunks = chunked(_validated_records(iter_upload_records(file), PasswordUpdate, errors))
+    try:
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            existing = await _existing_student_ids([item.id for _, item, _ in chunk])
+            found = []
+            for number, item, _ in chunk:
+                if item.id in existing:
+                    found.append(item)
+                else:
+                    errors.append((number, f"Student {item.id} not found"))
+            if not found:
+                continue
+            # Hashed before the UPDATE so the rows are not locked while scrypt runs
+            hashes = await hash_passwords(item.new_password for item in found)
+            cases = " ".join(["WHEN %s THEN %s"] * len(found))
+            placeholders = ", ".join(["%s"] * len(found))
+            params = [value for item, password_hash in zip(found, hashes) for value in (item.id, password_hash)]
+            params += [item.id for item in found]
+            async with db.transaction() as cursor:
+                await cursor.execute(f"UPDATE Student SET SPassword = CASE StudentID {cases} END WHERE StudentID IN ({placeholders})", params)
+            updated += len(found)
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=_partial_import(str(e), updated))
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_partial_import(f"Failed to update passwords: {str(e)}", updated))
+
+    errors.sort()
+    return _bulk_report(0, updated, errors)
@@ -1,78 +1,87 @@
 from fastapi import APIRouter, HTTPException
-from database import get_db_connection
+from database_async import db, DatabaseUnavailable
 from models import LoginRequest, LoginResponse
+from passwords import login_pool, HashPoolSaturated, PASSWORD_RETRY_AFTER
+from tokens import token_signer
 
 router = APIRouter()
 
+STUDENT_LOGIN_QUERY = "SELECT SName, SPassword FROM Student WHERE StudentID = %s"
+INSTRUCTOR_LOGIN_QUERY = "SELECT InstructorID, IName, SubjectID, IPassword FROM Instructor WHERE InstructorID = %s"
+ADMIN_LOGIN_QUERY = "SELECT AdminID, AName, APassword FROM Admin WHERE AdminID = %s"
+
+def _too_many_logins():
+    return HTTPException(status_code=429, detail="Too many logins in progress, please retry",
+                         headers={"Retry-After": str(PASSWORD_RETRY_AFTER)})
+
+async def _check_password(password, stored, table, password_column, id_column, user_id):
+    """Verify on the hash pool; plaintext and outdated hashes are replaced after a match."""
+    try:
+        matches, rehash = await login_pool.verify(password, stored)
+    except HashPoolSaturated:
+        raise _too_many_logins()
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if rehash:
+        try:
+            new_hash = await login_pool.hash(password)
+            # Only if the password was not changed in the meantime
+            async with db.transaction() as cursor:
+                await cursor.execute(
+                    f"UPDATE {table} SET {password_column} = %s WHERE {id_column} = %s AND {password_column} = %s",
+                    (new_hash, user_id, stored))
+        except HashPoolSaturated:
+            pass  # Rehashed on a later login
+        except Exception as e:
+            print(f"Failed to rehash password for {table} {user_id}: {e}")
+
 @router.post("/login/student", response_model=LoginResponse)
-def login_student(request: LoginRequest):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = conn.cursor()
-    cursor.execute("SELECT SName, SPassword FROM Student WHERE StudentID = %s", (request.id,))
-    result = cursor.fetchone()
-    
+async def login_student(request: LoginRequest):
+    result = await db.fetchone(STUDENT_LOGIN_QUERY, (request.id,))
+
     if result:
         db_name, db_pass = result
-        if request.password == db_pass:
-            cursor.close()
-            conn.close()
-            return LoginResponse(id=request.id, name=db_name, role="student")
-        else:
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        await _check_password(request.password, db_pass, "Student", "SPassword", "StudentID", request.id)
+        return LoginResponse(id=request.id, name=db_name, role="student",
+                             token=token_signer.issue("student", request.id))
     else:
         # Check if it's a new student registration attempt
         if request.password == "Student@123" and request.name:
             try:
-                cursor.execute("INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)", 
-                               (request.id, request.name, request.password))
-                conn.commit()
-                cursor.close()
-                conn.close()
-                return LoginResponse(id=request.id, name=request.name, role="student")
+                password_hash = await login_pool.hash(request.password)
+            except HashPoolSaturated:
+                raise _too_many_logins()
+            try:
+                async with db.transaction() as cursor:
+                    await cursor.execute("INSERT INTO Student (StudentID, SName, SPassword) VALUES (%s, %s, %s)",
+                                         (request.id, request.name, password_hash))
+                return LoginResponse(id=request.id, name=request.name, role="student",
+                                     token=token_signer.issue("student", request.id))
+            except DatabaseUnavailable:
+                raise
             except Exception as e:
-                cursor.close()
-                conn.close()
                 raise HTTPException(status_code=400, detail=f"Registration failed: {str(e)}")
         else:
-            cursor.close()
-            conn.close()
             raise HTTPException(status_code=404, detail="Student not found. Use default password 'Student@123' and provide name to register.")
 
 @router.post("/login/instructor", response_model=LoginResponse)
-def login_instructor(request: LoginRequest):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = conn.cursor()
-    cursor.execute("SELECT InstructorID, IName, SubjectID FROM Instructor WHERE InstructorID = %s AND IPassword = %s", (request.id, request.password))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
+async def login_instructor(request: LoginRequest):
+    result = await db.fetchone(INSTRUCTOR_LOGIN_QUERY, (request.id,))
+
     if result:
-        return LoginResponse(id=result[0], name=result[1], role="instructor", subject_id=result[2])
+        await _check_password(request.password, result[3], "Instructor", "IPassword", "InstructorID", result[0])
+        return LoginResponse(id=result[0], name=result[1], role="instructor", subject_id=result[2],
+                             token=token_signer.issue("instructor", result[0], result[2]))
     else:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
 @router.post("/login/admin", response_model=LoginResponse)
-def login_admin(request: LoginRequest):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = conn.cursor()
-    cursor.execute("SELECT AdminID, AName FROM Admin WHERE AdminID = %s AND APassword = %s", (request.id, request.password))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
+async def login_admin(request: LoginRequest):
+    result = await db.fetchone(ADMIN_LOGIN_QUERY, (request.id,))
+
     if result:
-        return LoginResponse(id=result[0], name=result[1], role="admin")
+        await _check_password(request.password, result[2], "Admin", "APassword", "AdminID", result[0])
+        return LoginResponse(id=result[0], name=result[1], role="admin",
+                             token=token_signer.issue("admin", result[0]))
     else:
         raise HTTPException(status_code=401, detail="Invalid credentials")
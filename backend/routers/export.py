@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from database import get_db_connection, READ
+from grading import letter_grade
+from archive import ATTEMPT_TABLES
+from tokens import Identity, current_identity
+from typing import Literal, Optional
+from datetime import datetime
+import csv
+import io
+import json
+
+router = APIRouter()
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = ["attempt_id", "student_id", "student_name", "subject_id", "subject_name", "score", "grade", "date"]
+
+def _export_rows(conn, conditions, params):
+    # Unbuffered cursor: rows are pulled from the server one chunk at a time,
+    # so memory stays flat however large the attempt history is.
+    cursor = conn.cursor(buffered=False)
+    try:
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        # Archived attempts all have lower AttemptIDs than live ones, so
+        # reading the tables one after the other keeps AttemptID order
+        for table in ATTEMPT_TABLES:
+            cursor.execute(f"""
+                SELECT qa.AttemptID, qa.StudentID, st.SName, qa.SubjectID, s.SubjectName, qa.Score, qa.AttemptTimestamp
+                FROM {table} qa
+                JOIN Student st ON qa.StudentID = st.StudentID
+                JOIN Subject s ON qa.SubjectID = s.SubjectID
+                {where}
+                ORDER BY qa.AttemptID
+            """, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                # AttemptTimestamp is nullable; such attempts export without a date
+                yield [
+                    [row[0], row[1], row[2], row[3], row[4], row[5], letter_grade(row[5]),
+                     row[6].strftime("%Y-%m-%d %H:%M:%S") if row[6] else None]
+                    for row in rows
+                ]
+    finally:
+        cursor.close()
+        conn.close()
+
+def _csv_stream(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_stream(chunks):
+    for chunk in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in chunk)
+
+@router.get("/grades")
+def export_grades(format: Literal['csv', 'ndjson'] = 'csv',
+                  subject_id: Optional[int] = None,
+                  since: Optional[datetime] = Query(None, description="Only attempts at or after this time"),
+                  until: Optional[datetime] = Query(None, description="Only attempts before this time"),
+                  identity: Identity = Depends(current_identity)):
+    # Admins export everything, instructors only their own subject
+    if identity.role == "instructor":
+        if subject_id not in (None, identity.subject_id):
+            raise HTTPException(status_code=403, detail="Not allowed for another subject")
+        subject_id = identity.subject_id
+    elif identity.role != "admin":
+        raise HTTPException(status_code=403, detail="This endpoint is for admins and instructors")
+    conditions, params = [], []
+    if subject_id is not None:
+        conditions.append("qa.SubjectID = %s")
+        params.append(subject_id)
+    if since is not None:
+        conditions.append("qa.AttemptTimestamp >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("qa.AttemptTimestamp < %s")
+        params.append(until)
+
+    conn = get_db_connection(READ)
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    chunks = _export_rows(conn, conditions, params)
+    scope = f"subject-{subject_id}" if subject_id is not None else "all-subjects"
+    if format == 'csv':
+        body, media_type = _csv_stream(chunks), "text/csv"
+    else:
+        body, media_type = _ndjson_stream(chunks), "application/x-ndjson"
+    # The generator returns the connection when it finishes; the background
+    # task covers responses that are abandoned before streaming starts.
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="grades-{scope}.{format}"'
+    }, background=BackgroundTask(conn.close))
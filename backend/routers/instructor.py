@@ -1,10 +1,56 @@
-from fastapi import APIRouter, HTTPException
-from database import get_db_connection
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from database import get_db_connection, READ
+from pagination import PageParams, fetch_page, like_prefix, page_slice
+from question_bank import question_bank
+from item_analysis import item_analysis
+from leaderboard import leaderboard_view, LEADERBOARD_SIZE
+from payloads import json_array, json_bytes_response, question_view_json
+from etags import Conditional
+from cache_bus import cache_bus, cache_key
+from tokens import Identity, authorize_instructor, check_subject
+from grading import letter_grade
+from summaries import GRADE_DISTRIBUTION_SQL, grade_distribution
+from archive import ATTEMPT_TABLES
+from bulk_io import UploadFormatError, chunked, iter_upload_records, validation_message
+from pydantic import BaseModel, ValidationError
+from typing import Dict, List, Literal, Optional
+import csv
+import io
+import json
 
 router = APIRouter()
 
+# Students with live or archived attempts; takes the subject id twice
+SUBJECT_STUDENTS_QUERY = """
+    SELECT st.StudentID, st.SName
+    FROM Student st
+    JOIN (SELECT StudentID FROM QuizAttempt WHERE SubjectID = %s
+          UNION
+          SELECT StudentID FROM QuizAttemptArchive WHERE SubjectID = %s) qa ON st.StudentID = qa.StudentID
+"""
+# Live and archived attempts, paged together by AttemptID with fetch_page
+GRADES_QUERIES = tuple(f"""
+    SELECT qa.AttemptID, st.SName, s.SubjectName, qa.Score
+    FROM {table} qa
+    JOIN Student st ON qa.StudentID = st.StudentID
+    JOIN Subject s ON qa.SubjectID = s.SubjectID""" for table in ATTEMPT_TABLES)
+GRADES_COUNT_QUERIES = tuple(f"SELECT COUNT(*) FROM {table} qa JOIN Student st ON qa.StudentID = st.StudentID"
+                             for table in ATTEMPT_TABLES)
+SUBJECT_TOTALS_QUERY = f"""
+    SELECT COUNT(*), COALESCE(SUM(ss.Attempts), 0), AVG(ss.BestScore), {GRADE_DISTRIBUTION_SQL}
+    FROM StudentSubjectSummary ss
+    WHERE ss.SubjectID = %s
+"""
+SUBJECT_TOP_QUERY = """
+    SELECT ss.StudentID, st.SName, ss.Attempts, ss.BestScore, ss.ScoreSum
+    FROM StudentSubjectSummary ss
+    JOIN Student st ON ss.StudentID = st.StudentID
+    WHERE ss.SubjectID = %s
+    ORDER BY ss.BestScore DESC, ss.StudentID
+    LIMIT %s
+"""
+
 class QuestionCreate(BaseModel):
     subject_id: int
     text: str
@@ -36,58 +82,112 @@ class QuestionView(BaseModel):
     correct_option: str
     difficulty: str
 
+class RowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[RowError]
+
+QUESTION_FIELDS = ["text", "option_a", "option_b", "option_c", "option_d", "correct_option", "difficulty"]
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+MAX_REPORTED_ERRORS = 1000
+
 class StudentView(BaseModel):
     id: int
     name: str
 
+class StudentSummary(BaseModel):
+    student_id: int
+    student_name: str
+    attempts: int
+    best_score: int
+    average_score: float
+    grade: str
+
+class SubjectSummary(BaseModel):
+    subject_id: int
+    students: int
+    attempts: int
+    average_best_score: float
+    grade_distribution: Dict[str, int]
+    top_students: List[StudentSummary]
+
 class StudentGrade(BaseModel):
     student_name: str
     subject_name: str
     score: int
     grade: str
 
+class LeaderboardEntry(BaseModel):
+    rank: int
+    student_id: int
+    student_name: str
+    best_score: int
+    reached_at: Optional[str] = None
+
+class Leaderboard(BaseModel):
+    subject_id: int
+    students: int
+    top: List[LeaderboardEntry]
+
+class ItemStats(BaseModel):
+    question_id: int
+    text: str
+    difficulty: str
+    responses: int
+    correct_rate: Optional[float]
+    option_distribution: Dict[str, int]
+    discrimination: Optional[float]
+    suggested_difficulty: Optional[str]
+
+class ItemAnalysis(BaseModel):
+    subject_id: int
+    last_attempt_id: int
+    questions: List[ItemStats]
+
 @router.get("/students/{subject_id}", response_model=List[StudentView])
 def get_students(subject_id: int):
-    conn = get_db_connection()
+    conn = get_db_connection(READ)
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT st.StudentID, st.SName 
-        FROM Student st 
-        JOIN QuizAttempt qa ON st.StudentID = qa.StudentID 
-        WHERE qa.SubjectID = %s
-    """, (subject_id,))
+    cursor.execute(SUBJECT_STUDENTS_QUERY, (subject_id, subject_id))
     students = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
     cursor.close()
     conn.close()
     return students
 
+def _question_bank(subject_id):
+    bank = question_bank.lookup(subject_id)
+    if bank is None:
+        conn = get_db_connection()
+        if not conn:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        try:
+            bank = question_bank.load(subject_id, conn)
+        finally:
+            conn.close()
+    return bank
+
 @router.get("/questions/{subject_id}", response_model=List[QuestionView])
-def get_questions(subject_id: int):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    cursor = conn.cursor()
-    cursor.execute("SELECT QuestionID, QuestionText, OptionA, OptionB, OptionC, OptionD, CorrectOption, Difficulty FROM Question WHERE SubjectID = %s", (subject_id,))
-    questions = []
-    for row in cursor.fetchall():
-        questions.append({
-            "id": row[0],
-            "text": row[1],
-            "option_a": row[2],
-            "option_b": row[3],
-            "option_c": row[4],
-            "option_d": row[5],
-            "correct_option": row[6],
-            "difficulty": row[7]
-        })
-    cursor.close()
-    conn.close()
-    return questions
+def get_questions(subject_id: int, request: Request, page: PageParams = Depends(),
+                  difficulty: Optional[Literal['Easy', 'Medium', 'Hard']] = None):
+    conditional = Conditional(request, "questions", subject_id)
+    if conditional.not_modified:
+        return conditional.not_modified_response()
+    # Served from the cached question bank, which the write handlers below invalidate
+    bank = _question_bank(subject_id)
+    records = bank.by_difficulty.get(difficulty, []) if difficulty else bank.records
+    records, headers = page_slice(records, page, key=lambda record: record.id)
+    headers.update(conditional.headers)
+    return json_bytes_response(json_array([question_view_json(record) for record in records]), headers=headers)
 
 @router.post("/question/add")
-def add_question(question: QuestionCreate):
+def add_question(question: QuestionCreate, identity: Identity = Depends(authorize_instructor)):
+    check_subject(identity, question.subject_id)
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -97,6 +197,7 @@ def add_question(question: QuestionCreate):
             INSERT INTO Question (SubjectID, QuestionText, OptionA, OptionB, OptionC, OptionD, CorrectOption, Difficulty) 
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """, (question.subject_id, question.text, question.option_a, question.option_b, question.option_c, question.option_d, question.correct_option, question.difficulty))
+        versions = cache_bus.bump(cursor, cache_key("questions", question.subject_id))
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -104,12 +205,14 @@ def add_question(question: QuestionCreate):
         conn.close()
         raise HTTPException(status_code=500, detail=f"Failed to add question: {str(e)}")
     
+    cache_bus.publish(versions)
     cursor.close()
     conn.close()
     return {"message": "Question added successfully"}
 
 @router.put("/question/update")
-def update_question(question: QuestionUpdate):
+def update_question(question: QuestionUpdate, identity: Identity = Depends(authorize_instructor)):
+    check_subject(identity, question.subject_id)
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -119,8 +222,10 @@ def update_question(question: QuestionUpdate):
             UPDATE Question SET QuestionText = %s, OptionA = %s, OptionB = %s, OptionC = %s, OptionD = %s, CorrectOption = %s, Difficulty = %s 
             WHERE QuestionID = %s AND SubjectID = %s
         """, (question.text, question.option_a, question.option_b, question.option_c, question.option_d, question.correct_option, question.difficulty, question.id, question.subject_id))
+        found = cursor.rowcount
+        versions = cache_bus.bump(cursor, cache_key("questions", question.subject_id)) if found else {}
         conn.commit()
-        if cursor.rowcount == 0:
+        if found == 0:
             cursor.close()
             conn.close()
             raise HTTPException(status_code=404, detail="Question not found or not in your subject")
@@ -130,6 +235,7 @@ def update_question(question: QuestionUpdate):
         conn.close()
         raise HTTPException(status_code=500, detail=f"Failed to update question: {str(e)}")
     
+    cache_bus.publish(versions)
     cursor.close()
     conn.close()
     return {"message": "Question updated successfully"}
@@ -142,8 +248,10 @@ def delete_question(subject_id: int, question_id: int):
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM Question WHERE QuestionID = %s AND SubjectID = %s", (question_id, subject_id))
+        found = cursor.rowcount
+        versions = cache_bus.bump(cursor, cache_key("questions", subject_id)) if found else {}
         conn.commit()
-        if cursor.rowcount == 0:
+        if found == 0:
             cursor.close()
             conn.close()
             raise HTTPException(status_code=404, detail="Question not found or not in your subject")
@@ -153,31 +261,40 @@ def delete_question(subject_id: int, question_id: int):
         conn.close()
         raise HTTPException(status_code=500, detail=f"Failed to delete question: {str(e)}")
     
+    cache_bus.publish(versions)
     cursor.close()
     conn.close()
     return {"message": "Question deleted successfully"}
 
 @router.get("/grades/{subject_id}", response_model=List[StudentGrade])
-def get_subject_grades(subject_id: int):
-    conn = get_db_connection()
+def get_subject_grades(subject_id: int, response: Response, page: PageParams = Depends(),
+                       name_prefix: Optional[str] = None,
+                       min_score: Optional[int] = Query(None, ge=0, le=100),
+                       max_score: Optional[int] = Query(None, ge=0, le=100)):
+    conn = get_db_connection(READ)
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT st.SName, s.SubjectName, qa.Score 
-        FROM QuizAttempt qa 
-        JOIN Student st ON qa.StudentID = st.StudentID 
-        JOIN Subject s ON qa.SubjectID = s.SubjectID
-        WHERE qa.SubjectID = %s
-    """, (subject_id,))
+    conditions, params = ["qa.SubjectID = %s"], [subject_id]
+    if name_prefix:
+        conditions.append("st.SName LIKE %s")
+        params.append(like_prefix(name_prefix))
+    if min_score is not None:
+        conditions.append("qa.Score >= %s")
+        params.append(min_score)
+    if max_score is not None:
+        conditions.append("qa.Score <= %s")
+        params.append(max_score)
+    rows = fetch_page(cursor, response, page, GRADES_QUERIES, GRADES_COUNT_QUERIES,
+                      "qa.AttemptID", conditions, params)
     
     results = []
-    for row in cursor.fetchall():
-        score = row[2]
-        grade = 'A' if score >= 90 else 'B' if score >= 70 else 'C' if score >= 50 else 'D' if score >= 30 else 'F'
+    for row in rows:
+        score = row[3]
+        grade = letter_grade(score)
         results.append({
-            "student_name": row[0],
-            "subject_name": row[1],
+            "student_name": row[1],
+            "subject_name": row[2],
             "score": score,
             "grade": grade
         })
@@ -185,3 +302,136 @@ def get_subject_grades(subject_id: int):
     cursor.close()
     conn.close()
     return results
+
+@router.get("/summary/{subject_id}", response_model=SubjectSummary)
+def get_subject_summary(subject_id: int, top: int = Query(10, ge=0, le=100)):
+    conn = get_db_connection(READ)
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    cursor = conn.cursor()
+    cursor.execute(SUBJECT_TOTALS_QUERY, (subject_id,))
+    totals = cursor.fetchone()
+    cursor.execute(SUBJECT_TOP_QUERY, (subject_id, top))
+    top_students = [{
+        "student_id": row[0],
+        "student_name": row[1],
+        "attempts": row[2],
+        "best_score": row[3],
+        "average_score": round(row[4] / row[2], 2) if row[2] else 0.0,
+        "grade": letter_grade(row[3])
+    } for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return {
+        "subject_id": subject_id,
+        "students": totals[0],
+        "attempts": int(totals[1]),
+        "average_best_score": round(float(totals[2] or 0), 2),
+        "grade_distribution": grade_distribution(totals[3:]),
+        "top_students": top_students
+    }
+
+@router.get("/questions/analysis/{subject_id}", response_model=ItemAnalysis)
+def get_item_analysis(subject_id: int):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        last_attempt_id, questions = item_analysis.analyze(subject_id, conn)
+    finally:
+        conn.close()
+    return {
+        "subject_id": subject_id,
+        "last_attempt_id": last_attempt_id,
+        "questions": questions
+    }
+
+@router.get("/leaderboard/{subject_id}", response_model=Leaderboard)
+async def get_leaderboard(subject_id: int, limit: int = Query(LEADERBOARD_SIZE, ge=1, le=LEADERBOARD_SIZE)):
+    return await leaderboard_view(subject_id, limit)
+
+def _validated_questions(records, subject_id, errors):
+    for number, record in records:
+        if isinstance(record, str):
+            errors.append((number, record))
+            continue
+        try:
+            question = QuestionCreate(**{**record, "subject_id": subject_id})
+        except ValidationError as e:
+            errors.append((number, validation_message(e)))
+            continue
+        correct_option = question.correct_option.strip().upper()
+        if correct_option not in ("A", "B", "C", "D"):
+            errors.append((number, "correct_option: must be one of A, B, C, D"))
+            continue
+        if question.difficulty not in DIFFICULTIES:
+            errors.append((number, "difficulty: must be one of Easy, Medium, Hard"))
+            continue
+        yield (subject_id, question.text, question.option_a, question.option_b, question.option_c,
+               question.option_d, correct_option, question.difficulty)
+
+@router.post("/questions/import/{subject_id}", response_model=ImportReport)
+def import_questions(subject_id: int, file: UploadFile = File(...)):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    cursor = conn.cursor()
+    errors = []
+    inserted = 0
+    try:
+        rows = _validated_questions(iter_upload_records(file), subject_id, errors)
+        for chunk in chunked(rows):
+            cursor.executemany("""
+                INSERT INTO Question (SubjectID, QuestionText, OptionA, OptionB, OptionC, OptionD, CorrectOption, Difficulty) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, chunk)
+            inserted += len(chunk)
+        versions = cache_bus.bump(cursor, cache_key("questions", subject_id)) if inserted else {}
+        conn.commit()
+    except UploadFormatError as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        raise HTTPException(status_code=500, detail=f"Failed to import questions: {str(e)}")
+
+    cache_bus.publish(versions)
+    cursor.close()
+    conn.close()
+    return {
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": [{"row": row, "error": error} for row, error in errors[:MAX_REPORTED_ERRORS]]
+    }
+
+@router.get("/questions/export/{subject_id}")
+def export_questions(subject_id: int, format: Literal['csv', 'json'] = 'csv'):
+    bank = _question_bank(subject_id)
+
+    # Same columns as the import accepts, so an export can be re-imported as is
+    records = ([q.text, *q.options, q.correct_option, q.difficulty] for q in bank.records)
+    if format == 'csv':
+        def body():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(QUESTION_FIELDS)
+            for chunk in chunked(records):
+                writer.writerows(chunk)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        media_type = "text/csv"
+    else:
+        def body():
+            yield "["
+            for i, record in enumerate(records):
+                yield ("," if i else "") + json.dumps(dict(zip(QUESTION_FIELDS, record)))
+            yield "]"
+        media_type = "application/json"
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="questions-subject-{subject_id}.{format}"'
+    })
@@ -1,11 +1,44 @@
-from fastapi import APIRouter, HTTPException
-from database import get_db_connection
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from database import READ
+from database_async import db, DatabaseUnavailable
+from question_bank import question_bank, BANK_QUERY
+from grading import letter_grade
+from summaries import RECORD_ATTEMPT_SQL, record_attempt_params
+from quiz_sessions import quiz_sessions, QuizSessionError, SESSION_HEADER
+from attempt_journal import attempt_journal
+from leaderboard import leaderboards, leaderboard_view, LEADERBOARD_SIZE
+from quiz_generator import generate_quiz, seen_questions, QUIZ_SIZE, SEEN_QUERY
+from payloads import json_array, json_bytes_response, payload_cache, quiz_question_json
+from etags import Conditional
+from tokens import Identity, authorize_student, check_student
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 router = APIRouter()
 
+# Live and archived attempts (archive.py); takes the student id twice
+RESULTS_QUERY = """
+    SELECT s.SubjectName, qa.Score, qa.AttemptTimestamp
+    FROM QuizAttempt qa
+    JOIN Subject s ON qa.SubjectID = s.SubjectID
+    WHERE qa.StudentID = %s
+    UNION ALL
+    SELECT s.SubjectName, qa.Score, qa.AttemptTimestamp
+    FROM QuizAttemptArchive qa
+    JOIN Subject s ON qa.SubjectID = s.SubjectID
+    WHERE qa.StudentID = %s
+    ORDER BY AttemptTimestamp DESC
+"""
+SUMMARY_QUERY = """
+    SELECT ss.SubjectID, s.SubjectName, ss.Attempts, ss.BestScore, ss.ScoreSum, ss.LastAttempt
+    FROM StudentSubjectSummary ss
+    JOIN Subject s ON ss.SubjectID = s.SubjectID
+    WHERE ss.StudentID = %s
+    ORDER BY s.SubjectName
+"""
+
 class Subject(BaseModel):
     id: int
     name: str
@@ -16,109 +49,146 @@ class Question(BaseModel):
     options: List[str]
     # Correct option is not sent to frontend for security
 
+class AnswerSubmission(BaseModel):
+    question_id: int
+    answer: Optional[Literal['A', 'B', 'C', 'D']] = None # None when left unanswered
+
 class QuizSubmission(BaseModel):
+    session_id: str # from the X-Quiz-Session header of the quiz response
     student_id: int
     subject_id: int
-    answers: List[dict] # [{"question_id": 1, "answer": "A"}, ...]
+    answers: List[AnswerSubmission]
 
 class QuizResult(BaseModel):
     score: int
     total: int
 
+class SubjectSummary(BaseModel):
+    subject_id: int
+    subject: str
+    attempts: int
+    best_score: int
+    average_score: float
+    last_attempt: Optional[str] = None
+
 class Grade(BaseModel):
     subject: str
     score: int
     grade: str
     date: str
 
+class LeaderboardEntry(BaseModel):
+    rank: int
+    student_id: int
+    student_name: str
+    best_score: int
+    reached_at: Optional[str] = None
+
+class Leaderboard(BaseModel):
+    subject_id: int
+    students: int
+    top: List[LeaderboardEntry]
+    you: Optional[LeaderboardEntry] = None
+
 @router.get("/subjects", response_model=List[Subject])
-def get_subjects():
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    cursor = conn.cursor()
-    cursor.execute("SELECT SubjectID, SubjectName FROM Subject")
-    subjects = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
-    return subjects
+async def get_subjects(request: Request):
+    conditional = Conditional(request, "subjects")
+    if conditional.not_modified:
+        return conditional.not_modified_response()
+    content = payload_cache.get("subjects")
+    if content is None:
+        rows = await db.fetchall("SELECT SubjectID, SubjectName FROM Subject")
+        content = payload_cache.put("subjects", [{"id": row[0], "name": row[1]} for row in rows])
+    return json_bytes_response(content, headers=conditional.headers)
 
 @router.get("/quiz/{subject_id}", response_model=List[Question])
-def get_quiz(subject_id: int):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    cursor = conn.cursor()
-    # Get 5 random questions
-    cursor.execute("SELECT QuestionID, QuestionText, OptionA, OptionB, OptionC, OptionD FROM Question WHERE SubjectID = %s ORDER BY RAND() LIMIT 5", (subject_id,))
-    questions = []
-    for row in cursor.fetchall():
-        questions.append({
-            "id": row[0],
-            "text": row[1],
-            "options": [row[2], row[3], row[4], row[5]]
-        })
-    cursor.close()
-    conn.close()
-    if len(questions) < 5:
+async def get_quiz(subject_id: int, identity: Identity = Depends(authorize_student)):
+    student_id = identity.id
+    bank = question_bank.lookup(subject_id)
+    if bank is None:
+        generation = question_bank.generation(subject_id)
+        rows = await db.fetchall(BANK_QUERY, (subject_id,))
+        bank = question_bank.store(subject_id, rows, generation)
+    if len(bank) < QUIZ_SIZE:
         raise HTTPException(status_code=400, detail="Not enough questions in database")
-    return questions
+    seen = seen_questions.get(student_id)
+    if seen is None:
+        rows = await db.fetchall(SEEN_QUERY, (student_id, student_id))
+        seen = seen_questions.store(student_id, (row[0] for row in rows))
+    # Questions per difficulty follow the blueprint, unseen ones first
+    questions = generate_quiz(bank, seen)
+    session = quiz_sessions.create(student_id, subject_id, questions)
+    return json_bytes_response(json_array([quiz_question_json(q) for q in questions]),
+                               headers={SESSION_HEADER: session.id})
 
 @router.post("/quiz/submit", response_model=QuizResult)
-def submit_quiz(submission: QuizSubmission):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    cursor = conn.cursor()
-    
-    score = 0
-    # Calculate score
+async def submit_quiz(submission: QuizSubmission, identity: Identity = Depends(authorize_student)):
+    check_student(identity, submission.student_id)
+    try:
+        session = quiz_sessions.take(submission.session_id)
+    except QuizSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if session.subject_id != submission.subject_id or session.student_id != identity.id:
+        quiz_sessions.restore(session)
+        raise HTTPException(status_code=403, detail="Quiz session belongs to a different student or subject")
+    answers = {}
     for ans in submission.answers:
-        cursor.execute("SELECT CorrectOption FROM Question WHERE QuestionID = %s", (ans['question_id'],))
-        result = cursor.fetchone()
-        if result and result[0] == ans['answer']:
-            score += 20 # 5 questions * 20 = 100
+        if ans.question_id not in session.answer_key:
+            quiz_sessions.restore(session)
+            raise HTTPException(status_code=400, detail=f"Question {ans.question_id} is not part of this quiz")
+        answers[ans.question_id] = ans.answer
+
+    # Grade from the answer key kept in the session; unanswered questions score zero
+    correct = sum(1 for qid, answer in answers.items() if session.answer_key[qid] == answer)
+    score = correct * 100 // len(session.answer_key)
+    # Stored as the attempt's AttemptTimestamp too, so the leaderboard and a
+    # later rebuild from QuizAttempt see the same time
+    attempted_at = datetime.now().replace(microsecond=0)
+
+    if attempt_journal is not None:
+        # Write-behind: the attempt is durable in the local journal and is
+        # flushed to MySQL in the background
+        try:
+            await run_in_threadpool(attempt_journal.append, submission.student_id, submission.subject_id, score, answers,
+                                    attempted_at)
+            leaderboards.record(submission.subject_id, submission.student_id, score, attempted_at)
+            seen_questions.mark(submission.student_id, session.answer_key)
+            return QuizResult(score=score, total=100)
+        except OSError as e:
+            print(f"Quiz attempt journal unavailable, writing synchronously: {e}")
             
     # Save attempt
     try:
-        cursor.execute("INSERT INTO QuizAttempt (StudentID, SubjectID, Score) VALUES (%s, %s, %s)", 
-                       (submission.student_id, submission.subject_id, score))
-        attempt_id = cursor.lastrowid
-        
-        # Save question attempts
-        for ans in submission.answers:
-            cursor.execute("INSERT INTO QuestionAttempt (AttemptID, QuestionID, StudentAnswer) VALUES (%s, %s, %s)", 
-                           (attempt_id, ans['question_id'], ans['answer']))
-        
-        conn.commit()
+        async with db.transaction() as cursor:
+            await cursor.execute("INSERT INTO QuizAttempt (StudentID, SubjectID, Score, AttemptTimestamp) VALUES (%s, %s, %s, %s)", 
+                                 (submission.student_id, submission.subject_id, score, attempted_at))
+            attempt_id = cursor.lastrowid
+            
+            # Save question attempts (executemany sends a single multi-row INSERT)
+            if answers:
+                await cursor.executemany("INSERT INTO QuestionAttempt (AttemptID, QuestionID, StudentAnswer) VALUES (%s, %s, %s)", 
+                                         [(attempt_id, qid, answer) for qid, answer in answers.items()])
+            
+            await cursor.execute(RECORD_ATTEMPT_SQL, record_attempt_params(submission.student_id, submission.subject_id, score, attempted_at))
     except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
+        # Let the student retry the same quiz
+        quiz_sessions.restore(session)
+        if isinstance(e, DatabaseUnavailable):
+            raise
         raise HTTPException(status_code=500, detail=f"Failed to save quiz attempt: {str(e)}")
-        
-    cursor.close()
-    conn.close()
+
+    leaderboards.record(submission.subject_id, submission.student_id, score, attempted_at)
+    seen_questions.mark(submission.student_id, session.answer_key)
     return QuizResult(score=score, total=100)
 
 @router.get("/results/{student_id}", response_model=List[Grade])
-def get_results(student_id: int):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT s.SubjectName, qa.Score, qa.AttemptTimestamp 
-        FROM QuizAttempt qa 
-        JOIN Subject s ON qa.SubjectID = s.SubjectID 
-        WHERE qa.StudentID = %s
-        ORDER BY qa.AttemptTimestamp DESC
-    """, (student_id,))
+async def get_results(student_id: int):
+    rows = await db.fetchall(RESULTS_QUERY, (student_id, student_id), intent=READ)
     
     results = []
-    for row in cursor.fetchall():
+    for row in rows:
         score = row[1]
-        grade = 'A' if score >= 90 else 'B' if score >= 70 else 'C' if score >= 50 else 'D' if score >= 30 else 'F'
+        grade = letter_grade(score)
         results.append({
             "subject": row[0],
             "score": score,
@@ -126,6 +196,21 @@ def get_results(student_id: int):
             "date": row[2].strftime("%Y-%m-%d %H:%M:%S")
         })
         
-    cursor.close()
-    conn.close()
     return results
+
+@router.get("/summary/{student_id}", response_model=List[SubjectSummary])
+async def get_summary(student_id: int):
+    rows = await db.fetchall(SUMMARY_QUERY, (student_id,), intent=READ)
+    return [{
+        "subject_id": row[0],
+        "subject": row[1],
+        "attempts": row[2],
+        "best_score": row[3],
+        "average_score": round(row[4] / row[2], 2) if row[2] else 0.0,
+        "last_attempt": row[5].strftime("%Y-%m-%d %H:%M:%S") if row[5] else None
+    } for row in rows]
+
+@router.get("/leaderboard/{subject_id}", response_model=Leaderboard)
+async def get_leaderboard(subject_id: int, student_id: Optional[int] = None,
+                          limit: int = Query(10, ge=1, le=LEADERBOARD_SIZE)):
+    return await leaderboard_view(subject_id, limit, student_id)
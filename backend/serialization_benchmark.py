@@ -0,0 +1,92 @@
+"""Micro-benchmark of the JSON response paths, without a database.
+
+Compares, for a quiz (5 questions), an instructor question page and the
+subject list:
+
+- "validate + json": response_model validation, jsonable_encoder and
+  json.dumps, the path responses used to take
+- "pydantic dump_json": validation plus pydantic's direct JSON encoding
+- "pre-serialized": joining the cached per-question bytes from payloads.py
+
+and the cost and size of gzip and brotli on the question page.
+
+    python serialization_benchmark.py --questions 200 --repeat 2000
+"""
+import argparse
+import gzip
+import json
+import random
+import timeit
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import compression
+from payloads import json_array, question_view_json, quiz_question_json
+from question_bank import SubjectBank
+from routers.instructor import QuestionView
+from routers.student import Question, Subject
+
+
+def synthetic_bank(size):
+    rows = [
+        (i, f"Synthetic question {i}: " + "lorem ipsum " * random.randint(3, 12),
+         f"Option A {i}", f"Option B {i}", f"Option C {i}", f"Option D {i}",
+         random.choice("ABCD"), random.choice(("Easy", "Medium", "Hard")))
+        for i in range(1, size + 1)
+    ]
+    return SubjectBank(1, rows)
+
+
+def per_call_us(fn, repeat):
+    return 1e6 * min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200, help="questions on the instructor page")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    random.seed(42)
+
+    bank = synthetic_bank(args.questions)
+    quiz = bank.sample(5)
+    subjects = [{"id": i, "name": f"Subject {i}"} for i in range(1, 9)]
+    quiz_dicts = [{"id": q.id, "text": q.text, "options": list(q.options)} for q in quiz]
+    page_dicts = [{
+        "id": q.id, "text": q.text, "option_a": q.options[0], "option_b": q.options[1], "option_c": q.options[2],
+        "option_d": q.options[3], "correct_option": q.correct_option, "difficulty": q.difficulty,
+    } for q in bank.records]
+    subjects_bytes = json.dumps(subjects, separators=(',', ':')).encode()
+
+    cases = [
+        ("quiz", TypeAdapter(List[Question]), quiz_dicts,
+         lambda: json_array([quiz_question_json(q) for q in quiz])),
+        (f"questions x{args.questions}", TypeAdapter(List[QuestionView]), page_dicts,
+         lambda: json_array([question_view_json(q) for q in bank.records])),
+        ("subjects", TypeAdapter(List[Subject]), subjects, lambda: subjects_bytes),
+    ]
+    print(f"{'response':<16}{'validate + json':>18}{'pydantic dump_json':>21}{'pre-serialized':>17}   (us per response)")
+    for name, adapter, payload, fast in cases:
+        fast()  # fill the per-question caches, as the first request would
+        old = per_call_us(lambda: json.dumps(jsonable_encoder(adapter.validate_python(payload))).encode(), args.repeat)
+        dump = per_call_us(lambda: adapter.dump_json(adapter.validate_python(payload)), args.repeat)
+        new = per_call_us(fast, args.repeat)
+        print(f"{name:<16}{old:>18.1f}{dump:>21.1f}{new:>17.1f}   {old / new:.0f}x faster than before")
+
+    body = json_array([question_view_json(q) for q in bank.records])
+    print(f"\ncompression of the {args.questions}-question page ({len(body)} bytes)")
+    encoders = [("gzip", lambda: gzip.compress(body, compression.GZIP_LEVEL))]
+    if compression.brotli is not None:
+        encoders.append(("brotli", lambda: compression.brotli.compress(body, quality=compression.BROTLI_QUALITY)))
+    else:
+        print("(brotli not installed, skipped)")
+    for name, encode in encoders:
+        size = len(encode())
+        cost = per_call_us(encode, max(1, args.repeat // 10))
+        print(f"{name:<8}{size:>9} bytes ({100 * size / len(body):.0f}%){cost:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Slow-query log.
+
+Every statement run through a pooled connection (or the aiomysql backend)
+that takes longer than SLOW_QUERY_MS is written as one JSON line to a
+rotating log file (SLOW_QUERY_LOG). Each line has the normalized SQL, the
+shape of its parameters (types only, never values), the duration and the
+route that issued it. SELECT/UPDATE/DELETE statements also get their
+EXPLAIN plan, at most once per statement per SLOW_QUERY_EXPLAIN_INTERVAL
+seconds, captured on a background thread with its own pooled connection.
+
+An in-memory aggregate per normalized statement backs the admin
+"top offenders" endpoint. Set SLOW_QUERY_MS=0 to disable all of this.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import database
+import metrics
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'logs/slow_queries.jsonl')
+SLOW_QUERY_LOG_BYTES = int(os.getenv('SLOW_QUERY_LOG_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 60))
+
+# Distinct statements kept in the in-memory aggregate
+MAX_TRACKED_STATEMENTS = 500
+# EXPLAINs waiting for the background thread before new ones are skipped
+MAX_PENDING_EXPLAINS = 8
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+
+_request_scope = contextvars.ContextVar("slow_query_request_scope", default=None)
+# Set on the EXPLAIN thread so its own statements are never recorded
+_explaining = contextvars.ContextVar("slow_query_explaining", default=False)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+", re.I)
+
+
+def normalize_sql(sql):
+    """Collapse literals, placeholders and lists so equivalent statements match."""
+    sql = " ".join(sql.split())
+    sql = _STRING.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _VALUES_LIST.sub(r"VALUES \1, ...", sql)
+
+
+def _types(params):
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def params_shape(params, many):
+    if params is None:
+        return None
+    if many:
+        params = list(params) if not isinstance(params, (list, tuple)) else params
+        return {"rows": len(params), "row": _types(params[0]) if params else []}
+    return _types(params)
+
+
+class SlowQueryMiddleware:
+    """Makes the current request visible to the slow-query recorder."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+def current_request():
+    """(handler name, "METHOD /path") of the request being served, if any."""
+    scope = _request_scope.get()
+    if scope is None:
+        return None, None
+    return metrics.route_name(scope), f"{scope['method']} {scope['path']}"
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms, path, explain=True, explain_interval=60.0):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._logger = None
+        self._statements = {}
+        self._last_explained = {}
+        self._pending_explains = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self.recorded = 0
+        self.explained = 0
+        self.explain_failures = 0
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(self.path, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                      backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger("quizsystem.slow_queries")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.handlers = [handler]
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        metrics.query_observers.append(self.observe)
+
+    def stop(self):
+        if self.observe in metrics.query_observers:
+            metrics.query_observers.remove(self.observe)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._logger is not None:
+            for handler in self._logger.handlers:
+                handler.close()
+            self._logger.handlers = []
+
+    def observe(self, sql, params, elapsed, many):
+        if elapsed < self.threshold or _explaining.get():
+            return
+        normalized = normalize_sql(sql)
+        route, path = current_request()
+        duration_ms = round(1000 * elapsed, 3)
+        entry = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": duration_ms,
+            "sql": normalized,
+            "params": params_shape(params, many),
+            "route": route,
+            "path": path,
+        }
+        explain = self._claim_explain(normalized, sql, many)
+        with self._lock:
+            self.recorded += 1
+            self._aggregate(normalized, duration_ms, route)
+        if explain:
+            # EXPLAIN needs the real parameters, which are never logged
+            self._executor.submit(self._explain_and_write, entry, sql, params)
+        else:
+            self._write(entry)
+
+    def _aggregate(self, normalized, duration_ms, route):
+        stats = self._statements.get(normalized)
+        if stats is None:
+            if len(self._statements) >= MAX_TRACKED_STATEMENTS:
+                # Forget the statement that has cost the least time so far
+                cheapest = min(self._statements, key=lambda key: self._statements[key]["total_ms"])
+                del self._statements[cheapest]
+            stats = self._statements[normalized] = {
+                "sql": normalized, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "last_seen": None, "routes": {}, "plan": None,
+            }
+        stats["count"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["last_seen"] = datetime.now().isoformat(timespec="seconds")
+        if route is not None:
+            stats["routes"][route] = stats["routes"].get(route, 0) + 1
+
+    def _claim_explain(self, normalized, sql, many):
+        if not self.explain or many or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(normalized)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            if self._pending_explains >= MAX_PENDING_EXPLAINS:
+                return False
+            if len(self._last_explained) >= MAX_TRACKED_STATEMENTS:
+                self._last_explained.clear()
+            self._last_explained[normalized] = now
+            self._pending_explains += 1
+        return True
+
+    def _explain_and_write(self, entry, sql, params):
+        token = _explaining.set(True)
+        try:
+            with database.db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = [{key: value for key, value in row.items() if value is not None} for row in cursor.fetchall()]
+                cursor.close()
+            entry["plan"] = plan
+            with self._lock:
+                self.explained += 1
+                stats = self._statements.get(entry["sql"])
+                if stats is not None:
+                    stats["plan"] = plan
+        except Exception as e:
+            # Any failure only costs the plan: the entry is still written, and
+            # an exception left in the executor's future would be lost unseen
+            print(f"Slow-query EXPLAIN failed: {e!r}")
+            entry["plan_error"] = str(e)
+            with self._lock:
+                self.explain_failures += 1
+        finally:
+            _explaining.reset(token)
+            with self._lock:
+                self._pending_explains -= 1
+        try:
+            self._write(entry)
+        except Exception as e:
+            print(f"Failed to write slow-query log entry: {e!r}")
+
+    def _write(self, entry):
+        self._logger.info(json.dumps(entry, default=str, separators=(',', ':')))
+
+    def top(self, limit=20, order_by="total_ms"):
+        with self._lock:
+            statements = sorted(self._statements.values(), key=lambda stats: stats[order_by], reverse=True)[:limit]
+            return [
+                dict(stats, total_ms=round(stats["total_ms"], 3),
+                     avg_ms=round(stats["total_ms"] / stats["count"], 3),
+                     routes=dict(sorted(stats["routes"].items(), key=lambda item: -item[1])[:5]))
+                for stats in statements
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold_ms": 1000 * self.threshold,
+                "recorded": self.recorded,
+                "statements": len(self._statements),
+                "explained": self.explained,
+                "explain_failures": self.explain_failures,
+            }
+
+slow_query_log = None
+if SLOW_QUERY_MS > 0:
+    slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG, SLOW_QUERY_EXPLAIN, SLOW_QUERY_EXPLAIN_INTERVAL)
@@ -0,0 +1,95 @@
+"""Per-student, per-subject score aggregates.
+
+StudentSubjectSummary holds one row per (StudentID, SubjectID) and is kept
+up to date by submit_quiz, in the same transaction as the QuizAttempt
+insert. Archiving attempts (archive.py) leaves it unchanged. If it ever
+drifts from QuizAttempt and QuizAttemptArchive it can be recomputed with:
+
+    python summaries.py rebuild
+"""
+import sys
+
+from database import get_db_connection
+
+RECORD_ATTEMPT_SQL = """
+    INSERT INTO StudentSubjectSummary (StudentID, SubjectID, Attempts, BestScore, ScoreSum, LastAttempt)
+    VALUES (%s, %s, 1, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        Attempts = Attempts + 1,
+        BestScore = GREATEST(BestScore, VALUES(BestScore)),
+        ScoreSum = ScoreSum + VALUES(ScoreSum),
+        LastAttempt = VALUES(LastAttempt)
+"""
+# Several attempts per row, written after the fact with their own
+# timestamps (write-behind); rows come from summary_rows()
+RECORD_ATTEMPTS_SQL = """
+    INSERT INTO StudentSubjectSummary (StudentID, SubjectID, Attempts, BestScore, ScoreSum, LastAttempt)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        Attempts = Attempts + VALUES(Attempts),
+        BestScore = GREATEST(BestScore, VALUES(BestScore)),
+        ScoreSum = ScoreSum + VALUES(ScoreSum),
+        LastAttempt = VALUES(LastAttempt)
+"""
+
+# Grade bands match grading.letter_grade, applied to each student's best score
+GRADE_DISTRIBUTION_SQL = """
+    SUM(ss.BestScore >= 90),
+    SUM(ss.BestScore >= 70 AND ss.BestScore < 90),
+    SUM(ss.BestScore >= 50 AND ss.BestScore < 70),
+    SUM(ss.BestScore >= 30 AND ss.BestScore < 50),
+    SUM(ss.BestScore < 30)
+"""
+
+def record_attempt_params(student_id, subject_id, score, attempted_at):
+    return (student_id, subject_id, score, score, attempted_at)
+
+def summary_rows(attempts):
+    """(student_id, subject_id, score, attempted_at) in time order -> RECORD_ATTEMPTS_SQL rows."""
+    totals = {}
+    for student_id, subject_id, score, attempted_at in attempts:
+        row = totals.get((student_id, subject_id))
+        if row is None:
+            totals[(student_id, subject_id)] = [student_id, subject_id, 1, score, score, attempted_at]
+        else:
+            row[2] += 1
+            row[3] = max(row[3], score)
+            row[4] += score
+            row[5] = attempted_at
+    return [tuple(row) for row in totals.values()]
+
+def grade_distribution(counts):
+    return dict(zip(['A', 'B', 'C', 'D', 'F'], (int(c or 0) for c in counts)))
+
+def rebuild_summaries(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM StudentSubjectSummary")
+        cursor.execute("""
+            INSERT INTO StudentSubjectSummary (StudentID, SubjectID, Attempts, BestScore, ScoreSum, LastAttempt)
+            SELECT StudentID, SubjectID, COUNT(*), MAX(Score), SUM(Score), MAX(AttemptTimestamp)
+            FROM (SELECT StudentID, SubjectID, Score, AttemptTimestamp FROM QuizAttempt
+                  UNION ALL
+                  SELECT StudentID, SubjectID, Score, AttemptTimestamp FROM QuizAttemptArchive) qa
+            GROUP BY StudentID, SubjectID
+        """)
+        rows = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return rows
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python summaries.py rebuild")
+        sys.exit(2)
+    conn = get_db_connection()
+    if not conn:
+        sys.exit(1)
+    try:
+        print(f"Rebuilt {rebuild_summaries(conn)} summary rows")
+    finally:
+        conn.close()
@@ -0,0 +1,215 @@
+"""Signed session tokens issued at login.
+
+A token is "kid.payload.signature", base64url without padding: payload
+is compact JSON {"r": role, "i": id, "s": subject_id, "e": expiry} and
+signature is HMAC-SHA256 over "kid.payload" with the key named by kid.
+Verifying one needs no database access. Verified tokens are kept in a
+small LRU cache, so repeat requests skip the HMAC and JSON parsing.
+
+Keys come from TOKEN_KEYS, "kid:secret" pairs separated by commas. The
+first key signs new tokens and every listed key is accepted, so a key is
+rotated by putting a new one first and removing the old one once the
+tokens it signed have expired (TOKEN_TTL seconds). Without TOKEN_KEYS a
+random key is generated per process, which only suits a single worker.
+
+The require_* and authorize_* functions are FastAPI dependencies. The
+authorize_* ones also check the student_id / subject_id in the path or
+query string against the token.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import orjson
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+import database
+
+TOKEN_KEYS = os.getenv('TOKEN_KEYS', '')
+TOKEN_TTL = int(os.getenv('TOKEN_TTL', 12 * 3600))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+
+class Identity(NamedTuple):
+    role: str
+    id: int
+    subject_id: Optional[int]
+    expires: int
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def parse_keys(spec):
+    """'k2:secret2,k1:secret1' -> [('k2', b'secret2'), ('k1', b'secret1')]"""
+    keys = []
+    for part in spec.split(','):
+        kid, _, secret = part.strip().partition(':')
+        if not kid or not secret or '.' in kid:
+            raise ValueError(f"Invalid TOKEN_KEYS entry {part!r}, expected kid:secret")
+        keys.append((kid, secret.encode()))
+    return keys
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class TokenSigner:
+    def __init__(self, keys, ttl=12 * 3600, cache_size=10000):
+        if not keys:
+            raise ValueError("At least one token key is needed")
+        self.signing_kid = keys[0][0]
+        self.keys = dict(keys)
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.hits = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def _signature(self, key, signed):
+        return _b64encode(hmac.new(key, signed.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, role, user_id, subject_id=None):
+        payload = _b64encode(orjson.dumps({"r": role, "i": user_id, "s": subject_id, "e": int(time.time()) + self.ttl}))
+        signed = f"{self.signing_kid}.{payload}"
+        self.issued += 1
+        return f"{signed}.{self._signature(self.keys[self.signing_kid], signed)}"
+
+    def verify(self, token):
+        now = time.time()
+        with self._lock:
+            identity = self._cache.get(token)
+            if identity is not None and identity.expires > now:
+                self._cache.move_to_end(token)
+                self.hits += 1
+                return identity
+        try:
+            identity = self._verify(token, now)
+        except InvalidToken:
+            self.rejected += 1
+            raise
+        with self._lock:
+            self._cache[token] = identity
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.verified += 1
+        return identity
+
+    def _verify(self, token, now):
+        kid, _, rest = token.partition(".")
+        payload, _, signature = rest.partition(".")
+        key = self.keys.get(kid)
+        if key is None or not payload or not signature:
+            raise InvalidToken("Invalid token")
+        if not hmac.compare_digest(self._signature(key, f"{kid}.{payload}"), signature):
+            raise InvalidToken("Invalid token")
+        try:
+            claims = orjson.loads(_b64decode(payload))
+            identity = Identity(claims["r"], claims["i"], claims["s"], claims["e"])
+        except (ValueError, KeyError, TypeError):
+            raise InvalidToken("Invalid token")
+        if identity.expires <= now:
+            raise InvalidToken("Token expired")
+        return identity
+
+    def stats(self):
+        with self._lock:
+            return {
+                "signing_kid": self.signing_kid,
+                "keys": len(self.keys),
+                "cached": len(self._cache),
+                "issued": self.issued,
+                "hits": self.hits,
+                "verified": self.verified,
+                "rejected": self.rejected,
+                "ttl_seconds": self.ttl,
+            }
+
+
+if TOKEN_KEYS:
+    _keys = parse_keys(TOKEN_KEYS)
+else:
+    print("TOKEN_KEYS is not set: using a random per-process token key. "
+          "Tokens will not survive a restart or work across workers.")
+    _keys = [("dev", secrets.token_bytes(32))]
+
+token_signer = TokenSigner(_keys, TOKEN_TTL, TOKEN_CACHE_SIZE)
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def current_identity(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)):
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    try:
+        identity = token_signer.verify(credentials.credentials)
+    except InvalidToken as e:
+        raise _unauthorized(str(e))
+    # For read-your-writes routing in database.py
+    database.request_user.set((identity.role, identity.id))
+    return identity
+
+
+def _require(role):
+    def dependency(identity: Identity = Depends(current_identity)):
+        if identity.role != role:
+            raise HTTPException(status_code=403, detail=f"This endpoint is for {role}s")
+        return identity
+    dependency.__name__ = f"require_{role}"
+    return dependency
+
+
+require_student = _require("student")
+require_instructor = _require("instructor")
+require_admin = _require("admin")
+
+
+def _scoped_param(request, name):
+    value = request.path_params.get(name, request.query_params.get(name))
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None  # Left to the route's own validation
+
+
+def check_student(identity, student_id):
+    if student_id is not None and student_id != identity.id:
+        raise HTTPException(status_code=403, detail="Not allowed for another student")
+
+
+def check_subject(identity, subject_id):
+    if subject_id is not None and subject_id != identity.subject_id:
+        raise HTTPException(status_code=403, detail="Not allowed for another subject")
+
+
+def authorize_student(request: Request, identity: Identity = Depends(require_student)):
+    check_student(identity, _scoped_param(request, "student_id"))
+    return identity
+
+
+def authorize_instructor(request: Request, identity: Identity = Depends(require_instructor)):
+    check_subject(identity, _scoped_param(request, "subject_id"))
+    return identity
@@ -2,6 +2,25 @@ import { StrictMode } from 'react'
 import { createRoot } from 'react-dom/client'
 import './index.css'
 import App from './App.jsx'
+import axios from 'axios'
+
+// Send the token issued at login with every API call
+axios.interceptors.request.use((request) => {
+  const user = JSON.parse(localStorage.getItem('user') || 'null')
+  if (user?.token) {
+    request.headers.Authorization = `Bearer ${user.token}`
+  }
+  return request
+})
+
+// An expired or rejected token sends the user back to the login page
+axios.interceptors.response.use(undefined, (error) => {
+  if (error.response?.status === 401 && !error.config?.url?.includes('/api/auth/')) {
+    localStorage.removeItem('user')
+    window.location.assign('/login')
+  }
+  return Promise.reject(error)
+})
 
 createRoot(document.getElementById('root')).render(
   <StrictMode>
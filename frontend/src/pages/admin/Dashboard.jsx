@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import config from '../../config';
+import { fetchAllPages } from '../../pagination';
 import './Dashboard.css';
 
 const AdminDashboard = () => {
@@ -26,8 +27,7 @@ const AdminDashboard = () => {
 
   const fetchStudents = async () => {
     try {
-      const response = await axios.get(`${config.API_BASE_URL}/api/admin/students`);
-      setStudents(response.data);
+      setStudents(await fetchAllPages(`${config.API_BASE_URL}/api/admin/students`));
     } catch (error) {
       console.error('Failed to fetch students', error);
     }
@@ -35,8 +35,7 @@ const AdminDashboard = () => {
 
   const fetchInstructors = async () => {
     try {
-      const response = await axios.get(`${config.API_BASE_URL}/api/admin/instructors`);
-      setInstructors(response.data);
+      setInstructors(await fetchAllPages(`${config.API_BASE_URL}/api/admin/instructors`));
     } catch (error) {
       console.error('Failed to fetch instructors', error);
     }
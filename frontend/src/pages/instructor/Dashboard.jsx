@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import config from '../../config';
+import { fetchAllPages } from '../../pagination';
 import './Dashboard.css';
 
 const InstructorDashboard = () => {
@@ -40,8 +41,7 @@ const InstructorDashboard = () => {
 
   const fetchQuestions = async (subjectId) => {
     try {
-      const response = await axios.get(`${config.API_BASE_URL}/api/instructor/questions/${subjectId}`);
-      setQuestions(response.data);
+      setQuestions(await fetchAllPages(`${config.API_BASE_URL}/api/instructor/questions/${subjectId}`));
     } catch (error) {
       console.error('Failed to fetch questions', error);
     }
@@ -58,8 +58,7 @@ const InstructorDashboard = () => {
 
   const fetchGrades = async (subjectId) => {
     try {
-      const response = await axios.get(`${config.API_BASE_URL}/api/instructor/grades/${subjectId}`);
-      setGrades(response.data);
+      setGrades(await fetchAllPages(`${config.API_BASE_URL}/api/instructor/grades/${subjectId}`));
     } catch (error) {
       console.error('Failed to fetch grades', error);
     }
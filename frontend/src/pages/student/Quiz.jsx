@@ -13,6 +13,7 @@ const StudentQuiz = () => {
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
   const [user, setUser] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
 
   useEffect(() => {
     const storedUser = localStorage.getItem('user');
@@ -20,19 +21,23 @@ const StudentQuiz = () => {
       navigate('/login');
       return;
     }
-    setUser(JSON.parse(storedUser));
+    const parsedUser = JSON.parse(storedUser);
+    setUser(parsedUser);
 
     if (!location.state?.subjectId) {
       navigate('/student/dashboard');
       return;
     }
 
-    fetchQuiz(location.state.subjectId);
+    fetchQuiz(location.state.subjectId, parsedUser.id);
   }, [location, navigate]);
 
-  const fetchQuiz = async (subjectId) => {
+  const fetchQuiz = async (subjectId, studentId) => {
     try {
-      const response = await axios.get(`${config.API_BASE_URL}/api/student/quiz/${subjectId}`);
+      const response = await axios.get(`${config.API_BASE_URL}/api/student/quiz/${subjectId}`, {
+        params: { student_id: studentId }
+      });
+      setSessionId(response.headers['x-quiz-session']);
       setQuestions(response.data);
       setLoading(false);
     } catch (error) {
@@ -72,6 +77,7 @@ const StudentQuiz = () => {
       }));
 
       const payload = {
+        session_id: sessionId,
         student_id: user.id,
         subject_id: location.state.subjectId,
         answers: formattedAnswers
@@ -0,0 +1,19 @@
+import axios from 'axios';
+
+// Largest page the list endpoints serve (pagination.MAX_PAGE_SIZE in the backend)
+const PAGE_SIZE = 1000;
+
+// Fetches every page of a keyset-paginated list endpoint, following the
+// X-Next-After-Id header until the last page.
+export const fetchAllPages = async (url, params = {}) => {
+  const items = [];
+  let afterId;
+  do {
+    const response = await axios.get(url, {
+      params: { ...params, limit: PAGE_SIZE, after_id: afterId },
+    });
+    items.push(...response.data);
+    afterId = response.headers['x-next-after-id'];
+  } while (afterId !== undefined);
+  return items;
+};